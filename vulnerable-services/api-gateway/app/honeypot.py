@@ -4,14 +4,18 @@ Honeypot Module - Trap endpoints to detect and track attackers
 This module implements various honeypot endpoints that mimic common attack targets.
 When an attacker accesses these endpoints, their activity is logged and metrics are tracked.
 """
+import json
+import asyncio
+import heapq
 import logging
 import time
 import hashlib
 import httpx
-from typing import Dict, Any, Set, Optional
+from collections import Counter, OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 from fastapi import Request, Response
-from fastapi.responses import JSONResponse, PlainTextResponse, HTMLResponse
+from fastapi.responses import PlainTextResponse, HTMLResponse
 from . import metrics as metrics_module
 from .config import settings
 
@@ -27,10 +31,63 @@ def get_http_client() -> httpx.AsyncClient:
         http_client = httpx.AsyncClient(timeout=5.0)
     return http_client
 
-# In-memory tracking of attacker IPs
+# In-memory tracking of attacker activity
 # In production, this should use Redis for distributed tracking
-attacker_ips: Set[str] = set()
-honeypot_hits: Dict[str, Dict[str, Any]] = {}
+# Both maps are LRU-ordered and capped so a scanner flood cannot exhaust memory
+MAX_TRACKED_HITS = 100_000
+MAX_TRACKED_ATTACKERS = 50_000
+
+# {ip: attacker summary} - most recently active attacker last
+attacker_ips: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+# {"ip:honeypot_type": hit details} - most recently hit entry last
+honeypot_hits: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+# Aggregates maintained incrementally so statistics never walk the maps
+hits_per_type: Counter = Counter()  # honeypot_type -> total hits
+unique_ips_per_type: Counter = Counter()  # honeypot_type -> tracked (ip, type) entries
+entries_per_severity: Counter = Counter()  # severity -> tracked (ip, type) entries
+severity_per_type: Dict[str, str] = {}  # honeypot_type -> severity of first hit
+
+# Hits are queued by track_honeypot_hit and applied in batches by _drain_hits
+# (client_ip, honeypot_type, severity, timestamp, path, user_agent, method)
+HitRecord = Tuple[str, str, str, str, str, str, str]
+HIT_QUEUE_SIZE = 10_000
+HIT_BATCH_SIZE = 500
+MAX_REPORTS_IN_FLIGHT = 4  # batches; bounds memory held by a slow incident-bot
+_hit_queue: Optional["asyncio.Queue[HitRecord]"] = None
+_drain_task: Optional[asyncio.Task] = None
+_report_tasks: set = set()  # in-flight incident-bot reports (strong references)
+
+
+# Fake API credentials served by the /api/keys honeypot.
+# Digests are constant, so the JSON body is built once at import.
+FAKE_API_KEY_PRODUCTION = "honeypot_fake_key_" + hashlib.sha256(b"fake1").hexdigest()[:32]
+FAKE_API_KEY_ADMIN = "honeypot_fake_admin_" + hashlib.sha256(b"fake2").hexdigest()[:32]
+FAKE_REFRESH_TOKEN = "honeypot_refresh_" + hashlib.sha256(b"fake3").hexdigest()
+
+FAKE_API_KEYS_BODY = json.dumps(
+    {
+        "api_keys": [
+            {
+                "name": "production_api_key",
+                "key": FAKE_API_KEY_PRODUCTION,
+                "created_at": "2024-01-01T00:00:00Z",
+                "scope": "read,write"
+            },
+            {
+                "name": "admin_api_key",
+                "key": FAKE_API_KEY_ADMIN,
+                "created_at": "2024-01-01T00:00:00Z",
+                "scope": "admin"
+            }
+        ],
+        "tokens": {
+            "jwt_secret": "honeypot_jwt_secret_fake_do_not_use",
+            "refresh_token": FAKE_REFRESH_TOKEN
+        }
+    },
+    separators=(",", ":")
+).encode("utf-8")
 
 
 def get_client_ip(request: Request) -> str:
@@ -101,31 +158,27 @@ async def report_to_incident_bot(
         logger.debug(f"Failed to report to incident-bot: {e}")
 
 
-async def track_honeypot_hit(
-    request: Request,
-    honeypot_type: str,
-    severity: str = "medium"
-) -> None:
-    """
-    Track honeypot hit with metrics, logging, and incident-bot integration
-
-    Args:
-        request: FastAPI request object
-        honeypot_type: Type of honeypot (admin_panel, secret_file, etc.)
-        severity: Attack severity (low, medium, high, critical)
-    """
-    client_ip = get_client_ip(request)
-    timestamp = datetime.utcnow().isoformat()
-    path = str(request.url.path)
-    user_agent = request.headers.get("User-Agent", "unknown")
+def _evict_oldest_hit() -> None:
+    """Drop the least recently hit entry and its contribution to the aggregates"""
+    _, hit = honeypot_hits.popitem(last=False)
+    unique_ips_per_type[hit["honeypot_type"]] -= 1
+    entries_per_severity[hit["severity"]] -= 1
 
-    # Track unique attacker IPs
-    attacker_ips.add(client_ip)
 
+def _apply_hit(
+    client_ip: str,
+    honeypot_type: str,
+    severity: str,
+    timestamp: str,
+    path: str,
+    user_agent: str
+) -> None:
+    """Fold a single honeypot hit into the in-memory tracking maps and aggregates"""
     # Update honeypot hit details
     hit_key = f"{client_ip}:{honeypot_type}"
-    if hit_key not in honeypot_hits:
-        honeypot_hits[hit_key] = {
+    hit = honeypot_hits.get(hit_key)
+    if hit is None:
+        hit = {
             "ip": client_ip,
             "honeypot_type": honeypot_type,
             "severity": severity,
@@ -135,53 +188,179 @@ async def track_honeypot_hit(
             "user_agent": user_agent,
             "paths": []
         }
+        honeypot_hits[hit_key] = hit
+        unique_ips_per_type[honeypot_type] += 1
+        entries_per_severity[severity] += 1
+        severity_per_type.setdefault(honeypot_type, severity)
+        if len(honeypot_hits) > MAX_TRACKED_HITS:
+            _evict_oldest_hit()
+    else:
+        honeypot_hits.move_to_end(hit_key)
 
-    honeypot_hits[hit_key]["hit_count"] += 1
-    honeypot_hits[hit_key]["last_seen"] = timestamp
+    hit["hit_count"] += 1
+    hit["last_seen"] = timestamp
+    hits_per_type[honeypot_type] += 1
 
     # Track accessed path
-    if path not in honeypot_hits[hit_key]["paths"]:
-        honeypot_hits[hit_key]["paths"].append(path)
+    if path not in hit["paths"]:
+        hit["paths"].append(path)
 
-    # Update Prometheus metrics
-    metrics_module.honeypot_hits_total.labels(
-        honeypot_type=honeypot_type,
-        severity=severity
-    ).inc()
+    # Track per-attacker summary (used for top attackers)
+    attacker = attacker_ips.get(client_ip)
+    if attacker is None:
+        attacker = {
+            "ip": client_ip,
+            "total_hits": 0,
+            "honeypots_accessed": set(),
+            "first_seen": timestamp,
+            "last_seen": timestamp,
+            "user_agent": user_agent
+        }
+        attacker_ips[client_ip] = attacker
+        if len(attacker_ips) > MAX_TRACKED_ATTACKERS:
+            attacker_ips.popitem(last=False)
+    else:
+        attacker_ips.move_to_end(client_ip)
 
-    metrics_module.honeypot_unique_attackers.set(len(attacker_ips))
+    attacker["total_hits"] += 1
+    attacker["last_seen"] = timestamp
+    attacker["honeypots_accessed"].add(honeypot_type)
 
     # Log the honeypot hit
     logger.warning(
-        f"Honeypot hit: type={honeypot_type}, severity={severity}, "
-        f"ip={client_ip}, path={path}, user_agent={user_agent}"
+        "Honeypot hit: type=%s, severity=%s, ip=%s, path=%s, user_agent=%s",
+        honeypot_type, severity, client_ip, path, user_agent
     )
 
-    # Report to incident-bot for attack correlation
-    await report_to_incident_bot(
-        ip_address=client_ip,
-        attack_type=f"honeypot_{honeypot_type}",
-        severity=severity,
-        target=path,
-        details={"honeypot_type": honeypot_type, "method": request.method},
-        user_agent=user_agent
-    )
 
+def _apply_batch(batch: List[HitRecord]) -> None:
+    """Apply a batch of hits to the tracking state in one pass"""
+    counts: Counter = Counter()
+    for client_ip, honeypot_type, severity, timestamp, path, user_agent, _ in batch:
+        _apply_hit(client_ip, honeypot_type, severity, timestamp, path, user_agent)
+        counts[honeypot_type, severity] += 1
 
-# ============================================================================
-# Honeypot Handlers
-# ============================================================================
+    # Update Prometheus metrics once per (type, severity) rather than per hit
+    for (honeypot_type, severity), n in counts.items():
+        metrics_module.honeypot_hits_total.labels(
+            honeypot_type=honeypot_type,
+            severity=severity
+        ).inc(n)
+    metrics_module.honeypot_unique_attackers.set(len(attacker_ips))
 
-async def honeypot_admin_panel(request: Request) -> Response:
+
+async def _report_batch(batch: List[HitRecord]) -> None:
+    """Report a batch of hits to incident-bot for attack correlation"""
+    await asyncio.gather(*(
+        report_to_incident_bot(
+            ip_address=client_ip,
+            attack_type=f"honeypot_{honeypot_type}",
+            severity=severity,
+            target=path,
+            details={"honeypot_type": honeypot_type, "method": method},
+            user_agent=user_agent
+        )
+        for client_ip, honeypot_type, severity, _, path, user_agent, method in batch
+    ))
+
+
+async def _drain_hits() -> None:
+    """Background consumer: drain queued hits in batches of up to HIT_BATCH_SIZE"""
+    while True:
+        batch = [await _hit_queue.get()]
+        while len(batch) < HIT_BATCH_SIZE and not _hit_queue.empty():
+            batch.append(_hit_queue.get_nowait())
+
+        try:
+            _apply_batch(batch)
+        except Exception as e:
+            logger.error("Failed to process honeypot hits: %s", e)
+
+        # Reporting runs alongside draining so a slow incident-bot cannot stall
+        # tracking; past MAX_REPORTS_IN_FLIGHT the batch is tracked but not reported
+        if len(_report_tasks) >= MAX_REPORTS_IN_FLIGHT:
+            metrics_module.honeypot_reports_dropped_total.inc(len(batch))
+            continue
+        task = asyncio.create_task(_report_batch(batch))
+        _report_tasks.add(task)
+        task.add_done_callback(_report_tasks.discard)
+
+
+def start_hit_consumer() -> None:
+    """Create the hit queue and start its consumer (call on application startup)"""
+    global _hit_queue, _drain_task
+    if _drain_task is None:
+        _hit_queue = asyncio.Queue(maxsize=HIT_QUEUE_SIZE)
+        _drain_task = asyncio.create_task(_drain_hits())
+
+
+async def stop_hit_consumer() -> None:
+    """Stop the consumer, applying any hits still waiting in the queue"""
+    global _hit_queue, _drain_task
+    if _drain_task is None:
+        return
+
+    _drain_task.cancel()
+    try:
+        await _drain_task
+    except asyncio.CancelledError:
+        pass
+
+    pending = []
+    while not _hit_queue.empty():
+        pending.append(_hit_queue.get_nowait())
+    _hit_queue = None
+    _drain_task = None
+
+    if pending:
+        _apply_batch(pending)
+        await _report_batch(pending)
+
+
+async def track_honeypot_hit(
+    request: Request,
+    honeypot_type: str,
+    severity: str = "medium"
+) -> None:
     """
-    Fake admin panel honeypot
-    Attracts: Admin panel brute force, credential stuffing
-    Severity: HIGH - indicates targeted attack
+    Track honeypot hit with metrics, logging, and incident-bot integration
+
+    The hit is queued and applied by the background consumer, so the request
+    only pays for a put. If the queue is full the hit is dropped rather than
+    letting a scanner flood slow down responses.
+
+    Args:
+        request: FastAPI request object
+        honeypot_type: Type of honeypot (admin_panel, secret_file, etc.)
+        severity: Attack severity (low, medium, high, critical)
     """
-    await track_honeypot_hit(request, "admin_panel", severity="high")
+    record = (
+        get_client_ip(request),
+        honeypot_type,
+        severity,
+        datetime.utcnow().isoformat(),
+        request.url.path,
+        request.headers.get("User-Agent", "unknown"),
+        request.method
+    )
+
+    if _hit_queue is None:
+        # Consumer not running (e.g. outside the app lifecycle) - apply inline
+        _apply_batch([record])
+        await _report_batch([record])
+        return
+
+    try:
+        _hit_queue.put_nowait(record)
+    except asyncio.QueueFull:
+        metrics_module.honeypot_hits_dropped_total.inc()
+
+
+# ============================================================================
+# Honeypot Bodies (static, shared by route handlers and the ASGI fast path)
+# ============================================================================
 
-    # Return realistic-looking admin login page
-    html_content = """
+ADMIN_PANEL_HTML = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -209,27 +388,7 @@ async def honeypot_admin_panel(request: Request) -> Response:
     </html>
     """
 
-    if request.method == "POST":
-        # POST requests indicate active attack attempt
-        await track_honeypot_hit(request, "admin_panel_post", severity="critical")
-        return JSONResponse(
-            status_code=401,
-            content={"error": "Invalid credentials"}
-        )
-
-    return HTMLResponse(content=html_content, status_code=200)
-
-
-async def honeypot_env_file(request: Request) -> Response:
-    """
-    Fake .env file honeypot
-    Attracts: Credential theft, secret scanning
-    Severity: CRITICAL - highly suspicious activity
-    """
-    await track_honeypot_hit(request, "secret_file_env", severity="critical")
-
-    # Return fake environment variables
-    fake_env = """
+FAKE_ENV_FILE = """
 # Application Configuration
 APP_NAME=DevSecOps Lab
 ENVIRONMENT=production
@@ -252,29 +411,7 @@ JWT_SECRET=honeypot_jwt_secret_fake
 REDIS_URL=redis://localhost:6379/0
 """
 
-    return PlainTextResponse(content=fake_env, status_code=200)
-
-
-async def honeypot_backup_file(request: Request) -> Response:
-    """
-    Fake backup file honeypot
-    Attracts: Data exfiltration attempts, backup file scanning
-    Severity: HIGH - indicates reconnaissance
-    """
-    path = str(request.url.path)
-
-    if "backup.zip" in path:
-        honeypot_type = "backup_zip"
-    elif "backup.sql" in path:
-        honeypot_type = "backup_sql"
-    else:
-        honeypot_type = "backup_file"
-
-    await track_honeypot_hit(request, honeypot_type, severity="high")
-
-    # Return fake backup file content
-    if ".sql" in path:
-        fake_content = """
+FAKE_SQL_BACKUP = """
 -- Database Backup (Honeypot)
 -- Generated: 2024-01-01 00:00:00
 
@@ -288,33 +425,11 @@ CREATE TABLE users (
 INSERT INTO users VALUES (1, 'admin', 'honeypot_hash_fake', 'admin@example.com');
 INSERT INTO users VALUES (2, 'user', 'honeypot_hash_fake', 'user@example.com');
 """
-        return PlainTextResponse(content=fake_content, status_code=200)
-    else:
-        # Fake ZIP file header (to appear legitimate)
-        return Response(
-            content=b"PK\x03\x04HONEYPOT_FAKE_ZIP",
-            status_code=200,
-            media_type="application/zip"
-        )
-
-
-async def honeypot_git_config(request: Request) -> Response:
-    """
-    Fake .git/config honeypot
-    Attracts: Source code theft, git exposure exploitation
-    Severity: HIGH - indicates advanced reconnaissance
-    """
-    path = str(request.url.path)
 
-    if ".git/config" in path:
-        honeypot_type = "git_config"
-    else:
-        honeypot_type = "git_head"
-
-    await track_honeypot_hit(request, honeypot_type, severity="high")
+# Fake ZIP file header (to appear legitimate)
+FAKE_ZIP_BACKUP = b"PK\x03\x04HONEYPOT_FAKE_ZIP"
 
-    if ".git/config" in path:
-        fake_config = """
+FAKE_GIT_CONFIG = """
 [core]
     repositoryformatversion = 0
     filemode = true
@@ -329,48 +444,28 @@ async def honeypot_git_config(request: Request) -> Response:
     remote = origin
     merge = refs/heads/main
 """
-        return PlainTextResponse(content=fake_config, status_code=200)
-    else:
-        # Fake .git/HEAD
-        return PlainTextResponse(content="ref: refs/heads/main\n", status_code=200)
-
-
-async def honeypot_config_json(request: Request) -> Response:
-    """
-    Fake config file honeypot
-    Attracts: Configuration file exposure attempts
-    Severity: MEDIUM - common reconnaissance pattern
-    """
-    path = str(request.url.path)
 
-    if ".json" in path:
-        honeypot_type = "config_json"
-    elif ".yml" in path or ".yaml" in path:
-        honeypot_type = "config_yaml"
-    else:
-        honeypot_type = "config_file"
-
-    await track_honeypot_hit(request, honeypot_type, severity="medium")
+FAKE_GIT_HEAD = "ref: refs/heads/main\n"
+
+FAKE_CONFIG_JSON_BODY = json.dumps(
+    {
+    "app_name": "DevSecOps Lab",
+    "version": "1.0.0",
+    "database": {
+        "host": "localhost",
+        "port": 5432,
+        "username": "honeypot_user",
+        "password": "honeypot_password_fake"
+    },
+    "api_keys": {
+        "stripe": "sk_test_honeypot_fake_key",
+        "sendgrid": "SG.honeypot_fake_key"
+    }
+},
+    separators=(",", ":")
+).encode("utf-8")
 
-    if ".json" in path:
-        fake_config = {
-            "app_name": "DevSecOps Lab",
-            "version": "1.0.0",
-            "database": {
-                "host": "localhost",
-                "port": 5432,
-                "username": "honeypot_user",
-                "password": "honeypot_password_fake"
-            },
-            "api_keys": {
-                "stripe": "sk_test_honeypot_fake_key",
-                "sendgrid": "SG.honeypot_fake_key"
-            }
-        }
-        return JSONResponse(content=fake_config, status_code=200)
-    else:
-        # Fake YAML config
-        fake_yaml = """
+FAKE_CONFIG_YAML = """
 app_name: DevSecOps Lab
 version: 1.0.0
 
@@ -384,19 +479,8 @@ api_keys:
   stripe: sk_test_honeypot_fake_key
   sendgrid: SG.honeypot_fake_key
 """
-        return PlainTextResponse(content=fake_yaml, status_code=200)
 
-
-async def honeypot_phpmyadmin(request: Request) -> Response:
-    """
-    Fake phpMyAdmin honeypot
-    Attracts: Database admin panel attacks
-    Severity: HIGH - targeted attack on database access
-    """
-    await track_honeypot_hit(request, "phpmyadmin", severity="high")
-
-    # Return realistic phpMyAdmin login page
-    html_content = """
+PHPMYADMIN_HTML = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -431,26 +515,7 @@ async def honeypot_phpmyadmin(request: Request) -> Response:
     </html>
     """
 
-    if request.method == "POST":
-        await track_honeypot_hit(request, "phpmyadmin_post", severity="critical")
-        return JSONResponse(
-            status_code=401,
-            content={"error": "Access denied"}
-        )
-
-    return HTMLResponse(content=html_content, status_code=200)
-
-
-async def honeypot_wordpress_login(request: Request) -> Response:
-    """
-    Fake WordPress login honeypot
-    Attracts: WordPress-specific attacks, CMS exploitation
-    Severity: MEDIUM - automated scanning
-    """
-    await track_honeypot_hit(request, "wordpress", severity="medium")
-
-    # Return realistic WordPress login page
-    html_content = """
+WORDPRESS_LOGIN_HTML = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -476,17 +541,192 @@ async def honeypot_wordpress_login(request: Request) -> Response:
     </html>
     """
 
+# Fixed JSON error bodies for POSTs to the login honeypots
+ADMIN_LOGIN_DENIED_BODY = json.dumps({"error": "Invalid credentials"}, separators=(",", ":")).encode("utf-8")
+PHPMYADMIN_DENIED_BODY = json.dumps({"error": "Access denied"}, separators=(",", ":")).encode("utf-8")
+
+_HTML = "text/html; charset=utf-8"
+_TEXT = "text/plain; charset=utf-8"
+_JSON = "application/json"
+
+# Static GET honeypots: path -> (body, content type, honeypot type, severity)
+# Served by StaticHoneypotMiddleware without routing; must mirror the handlers below
+HONEYPOT_TABLE: Dict[str, Tuple[bytes, str, str, str]] = {
+    "/admin": (ADMIN_PANEL_HTML.encode(), _HTML, "admin_panel", "high"),
+    "/admin/": (ADMIN_PANEL_HTML.encode(), _HTML, "admin_panel", "high"),
+    "/admin/login": (ADMIN_PANEL_HTML.encode(), _HTML, "admin_panel", "high"),
+    "/.env": (FAKE_ENV_FILE.encode(), _TEXT, "secret_file_env", "critical"),
+    "/backup.zip": (FAKE_ZIP_BACKUP, "application/zip", "backup_zip", "high"),
+    "/backup.sql": (FAKE_SQL_BACKUP.encode(), _TEXT, "backup_sql", "high"),
+    "/database.sql": (FAKE_SQL_BACKUP.encode(), _TEXT, "backup_file", "high"),
+    "/.git/config": (FAKE_GIT_CONFIG.encode(), _TEXT, "git_config", "high"),
+    "/.git/HEAD": (FAKE_GIT_HEAD.encode(), _TEXT, "git_head", "high"),
+    "/config.json": (FAKE_CONFIG_JSON_BODY, _JSON, "config_json", "medium"),
+    "/config.yml": (FAKE_CONFIG_YAML.encode(), _TEXT, "config_yaml", "medium"),
+    "/config.yaml": (FAKE_CONFIG_YAML.encode(), _TEXT, "config_yaml", "medium"),
+    "/phpmyadmin": (PHPMYADMIN_HTML.encode(), _HTML, "phpmyadmin", "high"),
+    "/phpmyadmin/": (PHPMYADMIN_HTML.encode(), _HTML, "phpmyadmin", "high"),
+    "/wp-login.php": (WORDPRESS_LOGIN_HTML.encode(), _HTML, "wordpress", "medium"),
+    "/wp-admin/": (WORDPRESS_LOGIN_HTML.encode(), _HTML, "wordpress", "medium"),
+    "/api/keys": (FAKE_API_KEYS_BODY, _JSON, "api_keys", "critical"),
+    "/api/secrets": (FAKE_API_KEYS_BODY, _JSON, "api_secrets", "critical"),
+    "/api/tokens": (FAKE_API_KEYS_BODY, _JSON, "api_tokens", "critical"),
+}
+
+
+# ============================================================================
+# Honeypot Handlers
+# ============================================================================
+
+async def honeypot_admin_panel(request: Request) -> Response:
+    """
+    Fake admin panel honeypot
+    Attracts: Admin panel brute force, credential stuffing
+    Severity: HIGH - indicates targeted attack
+    """
+    await track_honeypot_hit(request, "admin_panel", severity="high")
+
+    if request.method == "POST":
+        # POST requests indicate active attack attempt
+        await track_honeypot_hit(request, "admin_panel_post", severity="critical")
+        return Response(
+            content=ADMIN_LOGIN_DENIED_BODY,
+            status_code=401,
+            media_type="application/json"
+        )
+
+    return HTMLResponse(content=ADMIN_PANEL_HTML, status_code=200)
+
+
+async def honeypot_env_file(request: Request) -> Response:
+    """
+    Fake .env file honeypot
+    Attracts: Credential theft, secret scanning
+    Severity: CRITICAL - highly suspicious activity
+    """
+    await track_honeypot_hit(request, "secret_file_env", severity="critical")
+
+    # Return fake environment variables
+    return PlainTextResponse(content=FAKE_ENV_FILE, status_code=200)
+
+
+async def honeypot_backup_file(request: Request) -> Response:
+    """
+    Fake backup file honeypot
+    Attracts: Data exfiltration attempts, backup file scanning
+    Severity: HIGH - indicates reconnaissance
+    """
+    path = str(request.url.path)
+
+    if "backup.zip" in path:
+        honeypot_type = "backup_zip"
+    elif "backup.sql" in path:
+        honeypot_type = "backup_sql"
+    else:
+        honeypot_type = "backup_file"
+
+    await track_honeypot_hit(request, honeypot_type, severity="high")
+
+    # Return fake backup file content
+    if ".sql" in path:
+        return PlainTextResponse(content=FAKE_SQL_BACKUP, status_code=200)
+    else:
+        # Fake ZIP file header (to appear legitimate)
+        return Response(
+            content=FAKE_ZIP_BACKUP,
+            status_code=200,
+            media_type="application/zip"
+        )
+
+
+async def honeypot_git_config(request: Request) -> Response:
+    """
+    Fake .git/config honeypot
+    Attracts: Source code theft, git exposure exploitation
+    Severity: HIGH - indicates advanced reconnaissance
+    """
+    path = str(request.url.path)
+
+    if ".git/config" in path:
+        honeypot_type = "git_config"
+    else:
+        honeypot_type = "git_head"
+
+    await track_honeypot_hit(request, honeypot_type, severity="high")
+
+    if ".git/config" in path:
+        return PlainTextResponse(content=FAKE_GIT_CONFIG, status_code=200)
+    else:
+        # Fake .git/HEAD
+        return PlainTextResponse(content=FAKE_GIT_HEAD, status_code=200)
+
+
+async def honeypot_config_json(request: Request) -> Response:
+    """
+    Fake config file honeypot
+    Attracts: Configuration file exposure attempts
+    Severity: MEDIUM - common reconnaissance pattern
+    """
+    path = str(request.url.path)
+
+    if ".json" in path:
+        honeypot_type = "config_json"
+    elif ".yml" in path or ".yaml" in path:
+        honeypot_type = "config_yaml"
+    else:
+        honeypot_type = "config_file"
+
+    await track_honeypot_hit(request, honeypot_type, severity="medium")
+
+    if ".json" in path:
+        return Response(
+            content=FAKE_CONFIG_JSON_BODY,
+            status_code=200,
+            media_type="application/json"
+        )
+    else:
+        # Fake YAML config
+        return PlainTextResponse(content=FAKE_CONFIG_YAML, status_code=200)
+
+
+async def honeypot_phpmyadmin(request: Request) -> Response:
+    """
+    Fake phpMyAdmin honeypot
+    Attracts: Database admin panel attacks
+    Severity: HIGH - targeted attack on database access
+    """
+    await track_honeypot_hit(request, "phpmyadmin", severity="high")
+
+    if request.method == "POST":
+        await track_honeypot_hit(request, "phpmyadmin_post", severity="critical")
+        return Response(
+            content=PHPMYADMIN_DENIED_BODY,
+            status_code=401,
+            media_type="application/json"
+        )
+
+    return HTMLResponse(content=PHPMYADMIN_HTML, status_code=200)
+
+
+async def honeypot_wordpress_login(request: Request) -> Response:
+    """
+    Fake WordPress login honeypot
+    Attracts: WordPress-specific attacks, CMS exploitation
+    Severity: MEDIUM - automated scanning
+    """
+    await track_honeypot_hit(request, "wordpress", severity="medium")
+
     if request.method == "POST":
         await track_honeypot_hit(request, "wordpress_post", severity="high")
         return HTMLResponse(
-            content=html_content.replace(
+            content=WORDPRESS_LOGIN_HTML.replace(
                 "</form>",
                 '<p style="color:red;">Error: Invalid username or password.</p></form>'
             ),
             status_code=200
         )
 
-    return HTMLResponse(content=html_content, status_code=200)
+    return HTMLResponse(content=WORDPRESS_LOGIN_HTML, status_code=200)
 
 
 async def honeypot_api_keys(request: Request) -> Response:
@@ -506,29 +746,12 @@ async def honeypot_api_keys(request: Request) -> Response:
 
     await track_honeypot_hit(request, honeypot_type, severity="critical")
 
-    # Return fake API credentials
-    fake_keys = {
-        "api_keys": [
-            {
-                "name": "production_api_key",
-                "key": "honeypot_fake_key_" + hashlib.sha256(b"fake1").hexdigest()[:32],
-                "created_at": "2024-01-01T00:00:00Z",
-                "scope": "read,write"
-            },
-            {
-                "name": "admin_api_key",
-                "key": "honeypot_fake_admin_" + hashlib.sha256(b"fake2").hexdigest()[:32],
-                "created_at": "2024-01-01T00:00:00Z",
-                "scope": "admin"
-            }
-        ],
-        "tokens": {
-            "jwt_secret": "honeypot_jwt_secret_fake_do_not_use",
-            "refresh_token": "honeypot_refresh_" + hashlib.sha256(b"fake3").hexdigest()
-        }
-    }
-
-    return JSONResponse(content=fake_keys, status_code=200)
+    # Return fake API credentials (pre-serialized at import)
+    return Response(
+        content=FAKE_API_KEYS_BODY,
+        status_code=200,
+        media_type="application/json"
+    )
 
 
 async def get_honeypot_stats() -> Dict[str, Any]:
@@ -538,62 +761,30 @@ async def get_honeypot_stats() -> Dict[str, Any]:
     Returns:
         Dictionary with honeypot statistics and attacker information
     """
-    # Calculate statistics
-    total_hits = sum(hit["hit_count"] for hit in honeypot_hits.values())
-
-    # Group by honeypot type
-    hits_by_type = {}
-    for hit in honeypot_hits.values():
-        honeypot_type = hit["honeypot_type"]
-        if honeypot_type not in hits_by_type:
-            hits_by_type[honeypot_type] = {
-                "count": 0,
-                "severity": hit["severity"],
-                "unique_ips": set()
-            }
-        hits_by_type[honeypot_type]["count"] += hit["hit_count"]
-        hits_by_type[honeypot_type]["unique_ips"].add(hit["ip"])
-
-    # Convert sets to counts for JSON serialization
-    for honeypot_type in hits_by_type:
-        hits_by_type[honeypot_type]["unique_ips"] = len(hits_by_type[honeypot_type]["unique_ips"])
-
-    # Get top attackers
-    attacker_stats = {}
-    for hit in honeypot_hits.values():
-        ip = hit["ip"]
-        if ip not in attacker_stats:
-            attacker_stats[ip] = {
-                "ip": ip,
-                "total_hits": 0,
-                "honeypots_accessed": set(),
-                "first_seen": hit["first_seen"],
-                "last_seen": hit["last_seen"],
-                "user_agent": hit["user_agent"]
-            }
-        attacker_stats[ip]["total_hits"] += hit["hit_count"]
-        attacker_stats[ip]["honeypots_accessed"].add(hit["honeypot_type"])
-
-        # Update last seen
-        if hit["last_seen"] > attacker_stats[ip]["last_seen"]:
-            attacker_stats[ip]["last_seen"] = hit["last_seen"]
+    # Group by honeypot type (aggregates are kept up to date on every hit)
+    hits_by_type = {
+        honeypot_type: {
+            "count": count,
+            "severity": severity_per_type[honeypot_type],
+            "unique_ips": unique_ips_per_type[honeypot_type]
+        }
+        for honeypot_type, count in hits_per_type.items()
+    }
 
-    # Convert to list and sort by hit count
-    top_attackers = sorted(
-        [
-            {
-                **stats,
-                "honeypots_accessed": len(stats["honeypots_accessed"])
-            }
-            for stats in attacker_stats.values()
-        ],
-        key=lambda x: x["total_hits"],
-        reverse=True
-    )[:10]  # Top 10 attackers
+    # Get top 10 attackers by hit count
+    top_attackers = [
+        {
+            **stats,
+            "honeypots_accessed": len(stats["honeypots_accessed"])
+        }
+        for stats in heapq.nlargest(
+            10, attacker_ips.values(), key=lambda x: x["total_hits"]
+        )
+    ]
 
     return {
         "summary": {
-            "total_honeypot_hits": total_hits,
+            "total_honeypot_hits": sum(hits_per_type.values()),
             "unique_attacker_ips": len(attacker_ips),
             "honeypot_types_hit": len(hits_by_type),
             "last_updated": datetime.utcnow().isoformat()
@@ -601,9 +792,7 @@ async def get_honeypot_stats() -> Dict[str, Any]:
         "hits_by_type": hits_by_type,
         "top_attackers": top_attackers,
         "severity_distribution": {
-            "critical": sum(1 for hit in honeypot_hits.values() if hit["severity"] == "critical"),
-            "high": sum(1 for hit in honeypot_hits.values() if hit["severity"] == "high"),
-            "medium": sum(1 for hit in honeypot_hits.values() if hit["severity"] == "medium"),
-            "low": sum(1 for hit in honeypot_hits.values() if hit["severity"] == "low")
+            severity: entries_per_severity[severity]
+            for severity in ("critical", "high", "medium", "low")
         }
     }
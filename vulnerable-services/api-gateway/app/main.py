@@ -2,22 +2,29 @@
 API Gateway - Main Application
 Routes requests to backend microservices
 """
+import asyncio
 import logging
 import time
 import httpx
-from typing import Dict, Any
+import orjson
+from typing import Awaitable, Callable, Dict, Any, Optional, Tuple
 from fastapi import FastAPI, Request, Response, HTTPException, status, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from .config import settings
 from .middleware import (
     RateLimitMiddleware,
     SecurityHeadersMiddleware,
-    RequestValidationMiddleware,
-    LoggingMiddleware
+    GatewayMiddleware,
+    StaticHoneypotMiddleware,
+    ClientIPMiddleware
 )
 from .security import get_current_user
+from .waf_config import load_waf_config
+from .waf_signatures import signature_db
 from . import metrics as metrics_module
+from .metrics_batch import aggregator as metrics_aggregator
+from . import honeypot as honeypot_module
 
 # Configure logging
 logging.basicConfig(
@@ -33,26 +40,27 @@ app = FastAPI(
     description="API Gateway for DevSecOps Hacking Lab microservices",
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
+    default_response_class=ORJSONResponse,
 )
 
 # Add middleware (order matters - first added = last executed)
-# 1. Logging (outer layer - logs everything)
-app.add_middleware(LoggingMiddleware)
+# 0. Static honeypots (innermost - WAF, rate limits, headers and logging still apply)
+app.add_middleware(StaticHoneypotMiddleware)
 
-# 2. Security headers
+# 1. Security headers
 app.add_middleware(SecurityHeadersMiddleware)
 
-# 3. Rate limiting
+# 2. Rate limiting
 app.add_middleware(
     RateLimitMiddleware,
     requests_per_minute=60,  # 60 requests per minute
     burst_size=10  # Allow bursts of 10 requests
 )
 
-# 4. WAF / Request validation
-app.add_middleware(RequestValidationMiddleware)
+# 3. WAF / Request validation + logging (logs every request, including blocks)
+app.add_middleware(GatewayMiddleware)
 
-# 5. CORS middleware
+# 4. CORS middleware
 if settings.ENABLE_CORS:
     app.add_middleware(
         CORSMiddleware,
@@ -62,18 +70,45 @@ if settings.ENABLE_CORS:
         allow_headers=["*"],
     )
 
+# 5. Client IP resolution (outermost - inner layers read request.state.client_ip)
+app.add_middleware(ClientIPMiddleware)
+
+
+# Methods forwarded without a request body
+BODYLESS_METHODS = frozenset({"GET", "HEAD", "DELETE", "OPTIONS"})
+
+# Backend URL prefixes (computed once, reused on every proxied request)
+AUTH_SERVICE_PREFIX = settings.AUTH_SERVICE_URL.rstrip("/")
+USER_SERVICE_PREFIX = settings.USER_SERVICE_URL.rstrip("/")
+AUTH_HEALTH_URL = AUTH_SERVICE_PREFIX + "/health"
+USER_HEALTH_URL = USER_SERVICE_PREFIX + "/health"
 
-# HTTP Client for backend requests
-http_client = httpx.AsyncClient(
-    timeout=30.0,
-    follow_redirects=False,
+# Connection pool limits for the shared backend HTTP client
+BACKEND_POOL_LIMITS = httpx.Limits(
+    max_keepalive_connections=200,
+    max_connections=500,
 )
 
 
+@app.on_event("startup")
+async def startup_event():
+    """Create the shared backend HTTP client and start background workers"""
+    # One pooled client for all proxied and health-check requests
+    app.state.http = httpx.AsyncClient(
+        timeout=httpx.Timeout(30.0, connect=2.0),
+        limits=BACKEND_POOL_LIMITS,
+        follow_redirects=False,
+    )
+    honeypot_module.start_hit_consumer()
+    metrics_aggregator.start()
+
+
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Close HTTP client on shutdown"""
-    await http_client.aclose()
+    """Flush pending honeypot hits and metrics, close HTTP client on shutdown"""
+    await honeypot_module.stop_hit_consumer()
+    await metrics_aggregator.stop()
+    await app.state.http.aclose()
 
 
 @app.get("/health")
@@ -86,8 +121,8 @@ async def health_check():
     
     # Check auth-service
     try:
-        auth_response = await http_client.get(
-            f"{settings.AUTH_SERVICE_URL}/health",
+        auth_response = await app.state.http.get(
+            AUTH_HEALTH_URL,
             timeout=5.0
         )
         backend_status["auth-service"] = {
@@ -103,8 +138,8 @@ async def health_check():
     
     # Check user-service
     try:
-        user_response = await http_client.get(
-            f"{settings.USER_SERVICE_URL}/health",
+        user_response = await app.state.http.get(
+            USER_HEALTH_URL,
             timeout=5.0
         )
         backend_status["user-service"] = {
@@ -194,15 +229,15 @@ async def proxy_request(
     
     Args:
         request: Incoming FastAPI request
-        backend_url: Backend service base URL
-        path: Path to append to backend URL
+        backend_url: Backend service URL prefix (no trailing slash)
+        path: Path to append to backend URL (starting with "/")
         backend_name: Name of backend service (for metrics)
     
     Returns:
         Response from backend service
     """
     # Build target URL
-    target_url = f"{backend_url}{path}"
+    target_url = backend_url + path
     
     # Copy headers (exclude host)
     headers = dict(request.headers)
@@ -211,17 +246,22 @@ async def proxy_request(
     # Get query parameters
     query_params = dict(request.query_params)
     
-    # Get request body
-    body = await request.body()
+    # Stream request body for methods that can carry one (no full buffering)
+    if request.method in BODYLESS_METHODS:
+        body = None
+    else:
+        body = request.stream()
     
-    logger.info(f"Proxying {request.method} {path} -> {target_url}")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Proxying %s %s -> %s", request.method, path, target_url)
     
-    # Start timer for metrics
-    start_time = time.time()
+    # Start timer for metrics (event loop clock is monotonic)
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
     
     try:
         # Forward request to backend
-        backend_response = await http_client.request(
+        backend_response = await request.app.state.http.request(
             method=request.method,
             url=target_url,
             headers=headers,
@@ -230,7 +270,7 @@ async def proxy_request(
         )
         
         # Track metrics
-        duration = time.time() - start_time
+        duration = loop.time() - start_time
         metrics_module.track_backend_request(
             backend=backend_name,
             method=request.method,
@@ -239,11 +279,11 @@ async def proxy_request(
         )
         
         # Track gateway request metrics
-        metrics_module.gateway_requests_total.labels(
+        metrics_module.track_gateway_request(
             method=request.method,
             path=f"/{path.split('/')[0]}/*",  # Group by first path segment
             status_code=backend_response.status_code
-        ).inc()
+        )
         
         # Return backend response
         return Response(
@@ -253,21 +293,21 @@ async def proxy_request(
         )
         
     except httpx.ConnectError as e:
-        logger.error(f"Backend connection error: {e}")
+        logger.error("Backend connection error: %s", e)
         metrics_module.track_backend_error(backend_name, "connection_error")
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=f"Backend service unavailable: {backend_url}"
         )
     except httpx.TimeoutException as e:
-        logger.error(f"Backend timeout: {e}")
+        logger.error("Backend timeout: %s", e)
         metrics_module.track_backend_error(backend_name, "timeout")
         raise HTTPException(
             status_code=status.HTTP_504_GATEWAY_TIMEOUT,
             detail="Backend service timeout"
         )
     except Exception as e:
-        logger.error(f"Proxy error: {e}")
+        logger.error("Proxy error: %s", e)
         metrics_module.track_backend_error(backend_name, "bad_gateway")
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
@@ -291,8 +331,8 @@ async def route_auth(request: Request, path: str):
     """
     return await proxy_request(
         request,
-        settings.AUTH_SERVICE_URL,
-        f"/auth/{path}",
+        AUTH_SERVICE_PREFIX,
+        "/auth/" + path,
         backend_name="auth-service"
     )
 
@@ -316,8 +356,8 @@ async def route_users(request: Request, path: str):
     """
     return await proxy_request(
         request,
-        settings.USER_SERVICE_URL,
-        f"/{path}",
+        USER_SERVICE_PREFIX,
+        "/" + path,
         backend_name="user-service"
     )
 
@@ -339,8 +379,8 @@ async def route_demo(request: Request, path: str):
     """
     return await proxy_request(
         request,
-        settings.AUTH_SERVICE_URL,
-        f"/demo/{path}",
+        AUTH_SERVICE_PREFIX,
+        "/demo/" + path,
         backend_name="auth-service-demo"
     )
 
@@ -349,30 +389,45 @@ async def route_demo(request: Request, path: str):
 # Error Handlers
 # ============================================================================
 
+def _json_body(content: Dict[str, Any]) -> bytes:
+    """Serialize content exactly like ORJSONResponse does"""
+    return orjson.dumps(content)
+
+
+# Error bodies are serialized once; only the 404 message varies per request,
+# so its body is split around the (JSON-encoded) message string
+_NOT_FOUND_PREFIX, _NOT_FOUND_SUFFIX = _json_body({
+    "error": "Not Found",
+    "message": "\0",
+    "gateway": settings.APP_NAME
+}).split(b'"\\u0000"')
+
+INTERNAL_ERROR_BODY = _json_body({
+    "error": "Internal Server Error",
+    "message": "Gateway encountered an internal error",
+    "gateway": settings.APP_NAME
+})
+
+
 @app.exception_handler(404)
 async def not_found_handler(request: Request, exc):
     """Custom 404 handler"""
-    return JSONResponse(
+    message = orjson.dumps(f"Route {request.url.path} not found in gateway")
+    return Response(
+        content=_NOT_FOUND_PREFIX + message + _NOT_FOUND_SUFFIX,
         status_code=404,
-        content={
-            "error": "Not Found",
-            "message": f"Route {request.url.path} not found in gateway",
-            "gateway": settings.APP_NAME
-        }
+        media_type="application/json"
     )
 
 
 @app.exception_handler(500)
 async def internal_error_handler(request: Request, exc):
     """Custom 500 handler"""
-    logger.error(f"Internal error: {exc}")
-    return JSONResponse(
+    logger.error("Internal error: %s", exc)
+    return Response(
+        content=INTERNAL_ERROR_BODY,
         status_code=500,
-        content={
-            "error": "Internal Server Error",
-            "message": "Gateway encountered an internal error",
-            "gateway": settings.APP_NAME
-        }
+        media_type="application/json"
     )
 
 
@@ -380,84 +435,78 @@ async def internal_error_handler(request: Request, exc):
 # Honeypot Endpoints - Trap endpoints to detect attackers
 # ============================================================================
 
-from . import honeypot as honeypot_module
-
-# Admin panel honeypot
-@app.get("/admin")
-@app.get("/admin/")
-@app.get("/admin/login")
-@app.post("/admin/login")
-async def honeypot_admin(request: Request):
-    """Fake admin panel - attracts admin interface attacks"""
-    return await honeypot_module.honeypot_admin_panel(request)
-
-
-# Secret files honeypots
-@app.get("/.env")
-async def honeypot_env(request: Request):
-    """Fake .env file - attracts credential theft"""
-    return await honeypot_module.honeypot_env_file(request)
-
-
-@app.get("/backup.zip")
-@app.get("/backup.sql")
-@app.get("/database.sql")
-async def honeypot_backup(request: Request):
-    """Fake backup files - attracts data exfiltration"""
-    return await honeypot_module.honeypot_backup_file(request)
-
-
-# Git exposure honeypot
-@app.get("/.git/config")
-@app.get("/.git/HEAD")
-async def honeypot_git(request: Request):
-    """Fake git config - attracts source code theft"""
-    return await honeypot_module.honeypot_git_config(request)
+# Honeypot trap table: path -> (handler, allowed methods)
+# Each path is registered as its own route, so real routes keep their normal
+# 405 and trailing-slash redirect handling.
+# Static GET bodies are normally answered earlier by StaticHoneypotMiddleware.
+_GET = frozenset({"GET", "HEAD"})
+_GET_POST = frozenset({"GET", "HEAD", "POST"})
+
+HONEYPOT_ROUTES: Dict[str, Tuple[Callable[[Request], Awaitable[Response]], frozenset]] = {
+    # Admin panel - attracts admin interface attacks
+    "/admin": (honeypot_module.honeypot_admin_panel, _GET),
+    "/admin/": (honeypot_module.honeypot_admin_panel, _GET),
+    "/admin/login": (honeypot_module.honeypot_admin_panel, _GET_POST),
+    # Secret files - attracts credential theft
+    "/.env": (honeypot_module.honeypot_env_file, _GET),
+    # Backup files - attracts data exfiltration
+    "/backup.zip": (honeypot_module.honeypot_backup_file, _GET),
+    "/backup.sql": (honeypot_module.honeypot_backup_file, _GET),
+    "/database.sql": (honeypot_module.honeypot_backup_file, _GET),
+    # Git exposure - attracts source code theft
+    "/.git/config": (honeypot_module.honeypot_git_config, _GET),
+    "/.git/HEAD": (honeypot_module.honeypot_git_config, _GET),
+    # Config files - attracts config exposure attempts
+    "/config.json": (honeypot_module.honeypot_config_json, _GET),
+    "/config.yml": (honeypot_module.honeypot_config_json, _GET),
+    "/config.yaml": (honeypot_module.honeypot_config_json, _GET),
+    # CMS-specific - attracts database panel and WordPress attacks
+    "/phpmyadmin": (honeypot_module.honeypot_phpmyadmin, _GET),
+    "/phpmyadmin/": (honeypot_module.honeypot_phpmyadmin, _GET_POST),
+    "/wp-login.php": (honeypot_module.honeypot_wordpress_login, _GET_POST),
+    "/wp-admin/": (honeypot_module.honeypot_wordpress_login, _GET),
+    # API credentials - attracts credential theft
+    "/api/keys": (honeypot_module.honeypot_api_keys, _GET),
+    "/api/secrets": (honeypot_module.honeypot_api_keys, _GET),
+    "/api/tokens": (honeypot_module.honeypot_api_keys, _GET),
+}
+
+for _path, (_handler, _methods) in HONEYPOT_ROUTES.items():
+    app.add_api_route(_path, _handler, methods=sorted(_methods))
 
 
-# Config file honeypot
-@app.get("/config.json")
-@app.get("/config.yml")
-@app.get("/config.yaml")
-async def honeypot_config(request: Request):
-    """Fake config files - attracts config exposure attempts"""
-    return await honeypot_module.honeypot_config_json(request)
-
-
-# CMS-specific honeypots
-@app.get("/phpmyadmin")
-@app.get("/phpmyadmin/")
-@app.post("/phpmyadmin/")
-async def honeypot_pma(request: Request):
-    """Fake phpMyAdmin - attracts database panel attacks"""
-    return await honeypot_module.honeypot_phpmyadmin(request)
+# Honeypot statistics endpoint (for defense dashboard)
+# Stats responses change slowly, so they are serialized at most once per TTL
+STATS_CACHE_TTL_SECONDS = 5.0
+_stats_cache: Dict[str, Tuple[float, bytes]] = {}
 
 
-@app.get("/wp-login.php")
-@app.post("/wp-login.php")
-@app.get("/wp-admin/")
-async def honeypot_wordpress(request: Request):
-    """Fake WordPress - attracts CMS-specific attacks"""
-    return await honeypot_module.honeypot_wordpress_login(request)
+def _cached_stats_response(key: str) -> Optional[Response]:
+    """Return the cached stats body for key if it is still fresh"""
+    cached = _stats_cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < STATS_CACHE_TTL_SECONDS:
+        return Response(content=cached[1], media_type="application/json")
+    return None
 
 
-# API credentials honeypot
-@app.get("/api/keys")
-@app.get("/api/secrets")
-@app.get("/api/tokens")
-async def honeypot_api_keys(request: Request):
-    """Fake API keys endpoint - attracts credential theft"""
-    return await honeypot_module.honeypot_api_keys(request)
+def _store_stats_response(key: str, content: Dict[str, Any]) -> Response:
+    """Serialize stats (same encoding as ORJSONResponse), cache and return them"""
+    body = _json_body(content)
+    _stats_cache[key] = (time.monotonic(), body)
+    return Response(content=body, media_type="application/json")
 
 
-# Honeypot statistics endpoint (for defense dashboard)
 @app.get("/api/defense/honeypot-stats")
 async def get_honeypot_statistics():
     """
     Get honeypot statistics for monitoring dashboard
-    Shows attacker activity and patterns
+    Shows attacker activity and patterns (cached for STATS_CACHE_TTL_SECONDS)
     """
-    return await honeypot_module.get_honeypot_stats()
+    cached = _cached_stats_response("honeypot")
+    if cached is not None:
+        return cached
+
+    return _store_stats_response("honeypot", await honeypot_module.get_honeypot_stats())
 
 
 # WAF statistics endpoint
@@ -466,11 +515,14 @@ async def get_waf_statistics():
     """
     Get WAF statistics and configuration
     Shows signature database stats, enabled features, etc.
+    (cached for STATS_CACHE_TTL_SECONDS)
     """
-    from .waf_signatures import signature_db
-    from .waf_config import waf_config
+    cached = _cached_stats_response("waf")
+    if cached is not None:
+        return cached
 
-    return {
+    waf_config = load_waf_config()
+    return _store_stats_response("waf", {
         "signature_database": signature_db.get_stats(),
         "features": {
             "signature_detection": waf_config.enable_signature_detection,
@@ -489,7 +541,7 @@ async def get_waf_statistics():
             for limit in waf_config.endpoint_rate_limits
         ],
         "version": "2.5A"
-    }
+    })
 
 
 if __name__ == "__main__":
@@ -499,6 +551,7 @@ if __name__ == "__main__":
         host=settings.HOST,
         port=settings.PORT,
         reload=settings.DEBUG,
-        log_level=settings.LOG_LEVEL.lower()
+        log_level=settings.LOG_LEVEL.lower(),
+        access_log=False,  # GatewayMiddleware already logs every request
     )
 
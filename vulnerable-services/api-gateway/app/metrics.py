@@ -3,7 +3,9 @@ Prometheus metrics for API Gateway
 """
 from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
 from fastapi import Response
+from typing import Any, Dict, Tuple
 import logging
+from .metrics_batch import aggregator
 
 logger = logging.getLogger(__name__)
 
@@ -119,19 +121,61 @@ honeypot_unique_attackers = Gauge(
     "Number of unique IP addresses hitting honeypots"
 )
 
+honeypot_hits_dropped_total = Counter(
+    "gateway_honeypot_hits_dropped_total",
+    "Honeypot hits dropped because the tracking queue was full"
+)
+
+honeypot_reports_dropped_total = Counter(
+    "gateway_honeypot_reports_dropped_total",
+    "Honeypot hits not reported to incident-bot because too many reports were in flight"
+)
+
+
+# Metrics are scraped over the local network - never compress or cache them
+METRICS_RESPONSE_HEADERS = {
+    "Content-Encoding": "identity",
+    "Cache-Control": "no-cache",
+}
+
 
 def get_metrics() -> Response:
     """
     Endpoint handler for Prometheus metrics
     Returns metrics in Prometheus text format
     """
+    # Apply batched counter increments so the scrape sees every event
+    aggregator.flush()
     metrics_data = generate_latest()
     return Response(
         content=metrics_data,
-        media_type=CONTENT_TYPE_LATEST
+        media_type=CONTENT_TYPE_LATEST,
+        headers=METRICS_RESPONSE_HEADERS
     )
 
 
+# ============================================================================
+# Cached Label Children
+# ============================================================================
+# .labels() takes a lock and hashes the label tuple on every call. Children
+# are stable for the life of the process, so resolve each one once and reuse it.
+# Plain counters on the request path go through the batching aggregator instead.
+
+_jwt_success = gateway_jwt_validation_total.labels(result="success")
+_jwt_failure = gateway_jwt_validation_total.labels(result="failure")
+
+_jwt_failure_children: Dict[str, Any] = {}
+_backend_duration_children: Dict[Tuple[str, str], Any] = {}
+
+
+def _child(cache: Dict, key, metric, *labelvalues):
+    """Return the cached label child for key, resolving it on first use"""
+    child = cache.get(key)
+    if child is None:
+        child = cache[key] = metric.labels(*labelvalues)
+    return child
+
+
 def track_jwt_validation(success: bool, reason: str = None):
     """
     Track JWT validation metrics
@@ -141,11 +185,11 @@ def track_jwt_validation(success: bool, reason: str = None):
         reason: Reason for failure (if applicable)
     """
     if success:
-        gateway_jwt_validation_total.labels(result="success").inc()
+        _jwt_success.inc()
     else:
-        gateway_jwt_validation_total.labels(result="failure").inc()
+        _jwt_failure.inc()
         if reason:
-            gateway_jwt_validation_failures.labels(reason=reason).inc()
+            _child(_jwt_failure_children, reason, gateway_jwt_validation_failures, reason).inc()
 
 
 def track_rate_limit_block(client_ip: str):
@@ -167,7 +211,7 @@ def track_waf_block(reason: str, pattern: str = None, client_ip: str = None):
         pattern: Suspicious pattern detected (if applicable)
         client_ip: Client IP address (if applicable)
     """
-    gateway_waf_blocks_total.labels(reason=reason).inc()
+    aggregator.bump(gateway_waf_blocks_total, (reason,))
     
     if pattern and client_ip:
         gateway_waf_suspicious_patterns.labels(
@@ -186,18 +230,26 @@ def track_backend_request(backend: str, method: str, status_code: int, duration:
         status_code: Response status code
         duration: Request duration in seconds
     """
-    gateway_backend_requests_total.labels(
-        backend=backend,
-        method=method,
-        status_code=status_code
-    ).inc()
+    aggregator.bump(gateway_backend_requests_total, (backend, method, status_code))
     
-    gateway_backend_request_duration_seconds.labels(
-        backend=backend,
-        method=method
+    _child(
+        _backend_duration_children, (backend, method),
+        gateway_backend_request_duration_seconds, backend, method
     ).observe(duration)
 
 
+def track_gateway_request(method: str, path: str, status_code: int):
+    """
+    Track a request proxied through the gateway
+    
+    Args:
+        method: HTTP method
+        path: Grouped request path
+        status_code: Response status code
+    """
+    aggregator.bump(gateway_requests_total, (method, path, status_code))
+
+
 def track_backend_error(backend: str, error_type: str):
     """
     Track backend error
@@ -206,8 +258,5 @@ def track_backend_error(backend: str, error_type: str):
         backend: Backend service name
         error_type: Type of error (connection_error, timeout, bad_gateway)
     """
-    gateway_backend_errors_total.labels(
-        backend=backend,
-        error_type=error_type
-    ).inc()
+    aggregator.bump(gateway_backend_errors_total, (backend, error_type))
 
@@ -0,0 +1,78 @@
+"""
+Batched Prometheus counter updates for API Gateway
+
+Counters are bumped in a plain dict on the hot path and flushed to
+prometheus_client with a single inc(n) per label set, either on a short
+timer or right before a scrape.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_SECONDS = 0.1
+
+
+class MetricAggregator:
+    """
+    Accumulate counter increments and apply them in batches
+
+    bump() only touches a dict; flush() turns every pending
+    (counter, labels) total into one inc() on a cached label child.
+    """
+
+    def __init__(self, interval: float = FLUSH_INTERVAL_SECONDS):
+        self.interval = interval
+        self._pending: Dict[Tuple[Counter, Tuple[Any, ...]], float] = defaultdict(float)
+        self._children: Dict[Tuple[Counter, Tuple[Any, ...]], Any] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def bump(self, counter: Counter, labels: Tuple[Any, ...], n: float = 1.0) -> None:
+        """Record n increments of counter for the given label values"""
+        self._pending[counter, labels] += n
+
+    def flush(self) -> None:
+        """Apply all pending increments to the underlying counters"""
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, defaultdict(float)
+        for key, total in pending.items():
+            child = self._children.get(key)
+            if child is None:
+                counter, labels = key
+                child = self._children[key] = counter.labels(*labels)
+            child.inc(total)
+
+    async def _flusher(self) -> None:
+        """Flush pending increments every interval"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Failed to flush metrics: %s", e)
+
+    def start(self) -> None:
+        """Start the periodic flusher (call on application startup)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flusher())
+
+    async def stop(self) -> None:
+        """Stop the periodic flusher and apply anything still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.flush()
+
+
+# Shared aggregator for the gateway process
+aggregator = MetricAggregator()
@@ -5,36 +5,302 @@ Rate limiting, request validation, security headers, enhanced WAF
 import time
 import logging
 import re
-from typing import Dict, Tuple, Optional
-from collections import defaultdict
+import orjson
+from typing import Dict, List, Tuple, Optional
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from fastapi import Request, HTTPException, status
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response, JSONResponse
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from .security import extract_client_ip
 from .waf_signatures import signature_db
-from .waf_config import waf_config, EndpointRateLimit
+from .waf_config import load_waf_config, EndpointRateLimit
+from .honeypot import HONEYPOT_TABLE, track_honeypot_hit
 from . import metrics as metrics_module
 
+try:
+    import pcre2
+except ImportError:  # optional: UA/endpoint regexes fall back to the re engine
+    pcre2 = None
+
 logger = logging.getLogger(__name__)
 
+# Per-IP token bucket store: power-of-two shard count, total capacity across shards
+BUCKET_SHARDS = 64
+MAX_TRACKED_IPS = 100_000
+MAX_ENDPOINT_BUCKETS = 100_000
+
+# Internal health/scrape endpoints that bypass rate limiting, WAF and security headers
+INTERNAL_PATHS = frozenset({"/health", "/metrics"})
+
+# HTTP methods the WAF lets through
+ALLOWED_METHODS = frozenset({"GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS", "HEAD"})
+
+
+# Static response headers, pre-encoded as raw ASGI (name, value) pairs
+SECURITY_HEADERS = (
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+    # Gateway identification
+    (b"x-gateway", b"DevSecOps-API-Gateway"),
+    (b"x-gateway-version", b"0.1.0"),
+)
+
+# Headers the signature scan skips (raw ASGI names are lowercase bytes).
+# Origin/referer are skipped because they contain localhost in dev.
+SKIP_SCAN_HEADERS = frozenset({
+    b"host", b"user-agent", b"accept", b"connection", b"origin", b"referer", b"referrer",
+})
+
+WAF_PASSED_HEADERS = (
+    (b"x-waf-status", b"passed"),
+    (b"x-waf-version", b"2.5A"),
+)
+
+class _PreparedResponse:
+    """
+    JSON response encoded once and replayed as raw ASGI messages
+    Instances are shared across requests; each send gets a fresh header list.
+    """
+
+    __slots__ = ("status_code", "raw_headers", "body")
+
+    def __init__(self, status_code: int, body: bytes, extra_headers: Tuple[Tuple[bytes, bytes], ...] = ()):
+        self.status_code = status_code
+        self.body = body
+        self.raw_headers = (
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"content-type", b"application/json"),
+        ) + extra_headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": list(self.raw_headers)})
+        await send({"type": "http.response.body", "body": self.body})
+
+
+RETRY_AFTER_HEADERS = ((b"retry-after", b"60"),)
+
+# WAF block responses with fixed content, fully pre-encoded: {reason: response}
+BLOCK_RESPONSES = {
+    "missing_user_agent": _PreparedResponse(status.HTTP_403_FORBIDDEN, orjson.dumps({
+        "error": "Forbidden",
+        "message": "User-Agent header required",
+        "blocked_by": "WAF"
+    })),
+    "malicious_user_agent": _PreparedResponse(status.HTTP_403_FORBIDDEN, orjson.dumps({
+        "error": "Forbidden",
+        "message": "Malicious User-Agent detected",
+        "blocked_by": "WAF"
+    })),
+    "suspicious_bot": _PreparedResponse(status.HTTP_403_FORBIDDEN, orjson.dumps({
+        "error": "Forbidden",
+        "message": "Automated bot traffic not allowed",
+        "blocked_by": "WAF"
+    })),
+    "oversized_request": _PreparedResponse(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, orjson.dumps({
+        "error": "Request Entity Too Large",
+        "message": "Request body exceeds maximum size",
+        "blocked_by": "WAF"
+    })),
+    "oversized_url": _PreparedResponse(status.HTTP_414_REQUEST_URI_TOO_LONG, orjson.dumps({
+        "error": "URI Too Long",
+        "message": "URL exceeds maximum length",
+        "blocked_by": "WAF"
+    })),
+}
+
+
+def _set_raw_headers(raw: list, headers: Tuple[Tuple[bytes, bytes], ...]) -> None:
+    """
+    Set pre-encoded headers on a raw ASGI header list
+    Absent headers are appended directly; headers already present (e.g. from
+    a backend) are replaced rather than duplicated.
+    """
+    existing = {key for key, _ in raw}
+    for key, value in headers:
+        if key in existing:
+            raw[:] = [item for item in raw if item[0] != key]
+        raw.append((key, value))
+
+
+def _client_ip(scope: Scope) -> str:
+    """Client IP resolved by ClientIPMiddleware (falls back to parsing headers)"""
+    client_ip = scope.get("state", {}).get("client_ip")
+    if client_ip is None:
+        # extract_client_ip caches the result in the request state
+        client_ip = extract_client_ip(Request(scope))
+    return client_ip
+
+
+def _with_headers(send: Send, headers: Tuple[Tuple[bytes, bytes], ...]) -> Send:
+    """Wrap send so the response start message gets headers added"""
+    async def send_with_headers(message: Message) -> None:
+        if message["type"] == "http.response.start":
+            raw = list(message.get("headers", ()))
+            _set_raw_headers(raw, headers)
+            message["headers"] = raw
+        await send(message)
+    return send_with_headers
+
+
+def _block_response(reason: str) -> _PreparedResponse:
+    """Pre-encoded WAF block response for a fixed-content reason"""
+    return BLOCK_RESPONSES[reason]
+
+
+def _compile_regex(pattern: str, ignore_case: bool = False):
+    """
+    Compile a WAF pattern with PCRE2 + JIT when available, else with re
+    Both expose the same search()/match() API; UNICODE keeps PCRE2's case
+    folding and word boundaries in line with re on str input.
+    """
+    if pcre2 is not None:
+        try:
+            return pcre2.compile(pattern, (pcre2.I if ignore_case else 0) | pcre2.U)
+        except pcre2.error as e:
+            logger.warning(f"PCRE2 rejected pattern, using re: {pattern} ({e})")
+    return re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+
+
+# Characters that make a pattern more than a plain substring
+_REGEX_METACHARS = frozenset(".^$*+?{}[]\\|()")
+
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
+class _PatternSet:
+    """
+    Case-insensitive "does any pattern match" test over a pattern list
+
+    Plain-literal patterns are checked as substrings of the lowercased text,
+    so the common case needs no regex engine at all. Only the remaining
+    patterns are compiled into one alternation. Non-ASCII text goes through
+    the full alternation, whose Unicode case folding lower() cannot mimic.
+    """
+
+    __slots__ = ("literals", "regex", "full_regex")
+
+    def __init__(self, literals: Tuple[str, ...], regex, full_regex):
+        self.literals = literals
+        self.regex = regex
+        self.full_regex = full_regex
+
+    def search(self, text: str) -> bool:
+        if not text.isascii():
+            return self.full_regex.search(text) is not None
+
+        lowered = text.lower()
+        for literal in self.literals:
+            if literal in lowered:
+                return True
+        return self.regex is not None and self.regex.search(text) is not None
+
+
+def _compile_any(patterns: List[str], kind: str) -> Optional[_PatternSet]:
+    """
+    Compile a list of patterns into one case-insensitive matcher
+    Invalid patterns are logged and skipped; returns None if nothing is left
+    """
+    valid = []
+    for pattern in patterns:
+        try:
+            re.compile(pattern)
+            valid.append(pattern)
+        except re.error:
+            logger.error(f"Invalid {kind} pattern: {pattern}")
+
+    if not valid:
+        return None
+
+    literals = tuple(p.lower() for p in valid if p.isascii() and _REGEX_METACHARS.isdisjoint(p))
+    rest = [p for p in valid if not (p.isascii() and _REGEX_METACHARS.isdisjoint(p))]
+    return _PatternSet(
+        literals,
+        _compile_regex("|".join(f"(?:{p})" for p in rest), ignore_case=True) if rest else None,
+        _compile_regex("|".join(f"(?:{p})" for p in valid), ignore_case=True),
+    )
+
+
+class _EndpointBuckets(OrderedDict):
+    """
+    Per-endpoint token buckets keyed by (ip, endpoint_pattern)
+    Missing keys are created full via __missing__ (no closure per lookup).
+    Bounded LRU: creating a bucket past MAX_ENDPOINT_BUCKETS evicts the least
+    recently used one, which is the same as letting it refill to full.
+    """
+
+    __slots__ = ("capacities_mt",)
+
+    def __init__(self, capacities_mt: Dict[str, int]):
+        super().__init__()
+        self.capacities_mt = capacities_mt
+
+    def __missing__(self, key: Tuple[str, str]) -> List[int]:
+        if len(self) >= MAX_ENDPOINT_BUCKETS:
+            self.popitem(last=False)
+        bucket = [self.capacities_mt[key[1]], time.monotonic_ns() // 1_000_000]
+        self[key] = bucket
+        return bucket
+
+
+class ClientIPMiddleware:
+    """
+    Resolve the client IP once per request (outermost layer)
+
+    Pure ASGI middleware that stores the result in the request state, so
+    inner middlewares read request.state.client_ip instead of re-parsing
+    X-Forwarded-For.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http":
+            # Stores the result in scope["state"]["client_ip"]
+            extract_client_ip(Request(scope))
+        await self.app(scope, receive, send)
+
+
+class RateLimitMiddleware:
     """
     Token Bucket Rate Limiting Middleware
     
-    Limits requests per IP address using token bucket algorithm
+    Limits requests per IP address using token bucket algorithm.
+    Pure ASGI (no BaseHTTPMiddleware task/stream wrapper per request).
     """
     
-    def __init__(self, app, requests_per_minute: int = 60, burst_size: int = 10):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, requests_per_minute: int = 60, burst_size: int = 10):
+        self.app = app
         self.requests_per_minute = requests_per_minute
         self.burst_size = burst_size
-        self.refill_rate = requests_per_minute / 60.0  # tokens per second
         
-        # Storage: {ip_address: (tokens, last_refill_time)}
-        self.buckets: Dict[str, Tuple[float, float]] = defaultdict(
-            lambda: (self.burst_size, time.time())
+        # Tokens are stored in thousandths ("millitokens") as plain ints and
+        # refilled lazily on a monotonic millisecond clock, like the endpoint
+        # buckets in GatewayMiddleware.
+        self.capacity_mt = burst_size * 1000
+        
+        # Storage: sharded LRU of {ip_address: [millitokens, last_refill_ms]}
+        # New buckets start full. Bounded so an IP-spraying flood cannot grow
+        # memory without limit; evicting a bucket is the same as letting it
+        # refill to full. The event loop is single-threaded, so shards need
+        # no locks.
+        self.shards: List["OrderedDict[str, List[int]]"] = [
+            OrderedDict() for _ in range(BUCKET_SHARDS)
+        ]
+        self.shard_capacity = MAX_TRACKED_IPS // BUCKET_SHARDS
+        
+        # Pre-encoded header values (remaining tokens range over 0..burst_size)
+        self._limit_header = str(requests_per_minute).encode("latin-1")
+        self._remaining_headers = [str(n).encode("latin-1") for n in range(burst_size + 1)]
+        self._limited_response = _PreparedResponse(
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            orjson.dumps({
+                "error": "Rate Limit Exceeded",
+                "message": f"Too many requests. Limit: {requests_per_minute} requests per minute.",
+                "retry_after": 60
+            }),
+            RETRY_AFTER_HEADERS
         )
         
         logger.info(
@@ -42,102 +308,101 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             f"burst: {burst_size}"
         )
     
-    def _get_tokens(self, ip: str) -> Tuple[float, float]:
-        """Get current token count for IP"""
-        tokens, last_refill = self.buckets[ip]
-        
-        # Refill tokens based on time elapsed
-        now = time.time()
-        time_elapsed = now - last_refill
-        tokens_to_add = time_elapsed * self.refill_rate
-        
-        # Cap at burst size
-        tokens = min(self.burst_size, tokens + tokens_to_add)
-        
-        return tokens, now
-    
-    def _consume_token(self, ip: str) -> bool:
+    def _consume_token(self, ip: str) -> Tuple[bool, int]:
         """
         Try to consume a token for this request
-        Returns True if request allowed, False if rate limited
+        Returns (allowed, remaining millitokens)
         """
-        tokens, now = self._get_tokens(ip)
+        shard = self.shards[hash(ip) & (BUCKET_SHARDS - 1)]
+        now_ms = time.monotonic_ns() // 1_000_000
         
-        if tokens >= 1.0:
-            # Allow request, consume token
-            self.buckets[ip] = (tokens - 1.0, now)
-            return True
+        bucket = shard.get(ip)
+        if bucket is None:
+            if len(shard) >= self.shard_capacity:
+                shard.popitem(last=False)
+            bucket = shard[ip] = [self.capacity_mt, now_ms]
         else:
+            shard.move_to_end(ip)
+            # Lazy refill (millitokens per ms = rpm * 1000 / 60000). The clock
+            # only advances once a whole millitoken has accrued.
+            added_mt = (now_ms - bucket[1]) * self.requests_per_minute // 60
+            if added_mt:
+                tokens_mt = bucket[0] + added_mt
+                bucket[0] = tokens_mt if tokens_mt < self.capacity_mt else self.capacity_mt
+                bucket[1] = now_ms
+        
+        tokens_mt = bucket[0]
+        if tokens_mt < 1000:
             # Rate limited
-            self.buckets[ip] = (tokens, now)
-            return False
+            return False, tokens_mt
+        
+        # Allow request, consume token
+        tokens_mt -= 1000
+        bucket[0] = tokens_mt
+        return True, tokens_mt
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
         """Process request with rate limiting"""
         # Skip rate limiting for health checks
-        if request.url.path in ["/health", "/metrics"]:
-            return await call_next(request)
+        if scope["type"] != "http" or scope["path"] in INTERNAL_PATHS:
+            await self.app(scope, receive, send)
+            return
         
         # Extract client IP
-        client_ip = extract_client_ip(request)
+        client_ip = _client_ip(scope)
         
         # Check rate limit
-        if not self._consume_token(client_ip):
+        allowed, tokens_mt = self._consume_token(client_ip)
+        if not allowed:
             logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-            return JSONResponse(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                content={
-                    "error": "Rate Limit Exceeded",
-                    "message": f"Too many requests. Limit: {self.requests_per_minute} requests per minute.",
-                    "retry_after": 60
-                },
-                headers={"Retry-After": "60"}
-            )
-        
-        # Process request
-        response = await call_next(request)
-        
-        # Add rate limit headers
-        tokens, _ = self._get_tokens(client_ip)
-        response.headers["X-RateLimit-Limit"] = str(self.requests_per_minute)
-        response.headers["X-RateLimit-Remaining"] = str(int(tokens))
+            await self._limited_response(scope, receive, send)
+            return
         
-        return response
+        # Process request, adding rate limit headers to the response
+        await self.app(scope, receive, _with_headers(send, (
+            (b"x-ratelimit-limit", self._limit_header),
+            (b"x-ratelimit-remaining", self._remaining_headers[tokens_mt // 1000]),
+        )))
 
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    """Add security headers to all responses"""
+class SecurityHeadersMiddleware:
+    """Add security headers to all responses (except internal scrape paths)"""
     
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # Security headers
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        
-        # Gateway identification
-        response.headers["X-Gateway"] = "DevSecOps-API-Gateway"
-        response.headers["X-Gateway-Version"] = "0.1.0"
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        # Health checks and metric scrapes are not browser-facing
+        if scope["type"] != "http" or scope["path"] in INTERNAL_PATHS:
+            await self.app(scope, receive, send)
+            return
         
-        return response
+        await self.app(scope, receive, _with_headers(send, SECURITY_HEADERS))
 
 
-class RequestValidationMiddleware(BaseHTTPMiddleware):
+class GatewayMiddleware:
     """
+    Combined WAF validation and request logging (pure ASGI)
+
     Enhanced WAF-style request validation with:
     - Signature-based attack detection
     - User-Agent filtering
     - Bot detection
     - Geo-blocking (placeholder)
     - Per-endpoint rate limiting
+
+    Every request, including WAF and rate-limit rejections, is logged with
+    its duration and gets an X-Response-Time header.
     """
 
-    def __init__(self, app):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # Resolved when the middleware stack is built, not at import
+        self.waf_config = waf_config = load_waf_config()
 
-        # Compile endpoint rate limit patterns
+        # Compile endpoint rate limit patterns into one alternation with a
+        # named group per limit, so a single match() finds the first limit
+        # (in config order) that applies to the path
         self.compiled_endpoint_limits = []
         for limit in waf_config.endpoint_rate_limits:
             try:
@@ -146,134 +411,106 @@ class RequestValidationMiddleware(BaseHTTPMiddleware):
             except re.error:
                 logger.error(f"Invalid endpoint pattern: {limit.endpoint_pattern}")
 
-        # Compile User-Agent patterns
-        self.blocked_ua_patterns = []
-        for pattern in waf_config.blocked_user_agents:
-            try:
-                self.blocked_ua_patterns.append(re.compile(pattern, re.IGNORECASE))
-            except re.error:
-                logger.error(f"Invalid User-Agent pattern: {pattern}")
-
-        self.bot_patterns = []
-        for pattern in waf_config.bot_detection_patterns:
-            try:
-                self.bot_patterns.append(re.compile(pattern, re.IGNORECASE))
-            except re.error:
-                logger.error(f"Invalid bot pattern: {pattern}")
+        self.endpoint_limits_by_group = {
+            f"lim{i}": limit for i, (_, limit) in enumerate(self.compiled_endpoint_limits)
+        }
+        self.endpoint_limit_regex = _compile_regex("|".join(
+            f"(?P<lim{i}>{limit.endpoint_pattern})"
+            for i, (_, limit) in enumerate(self.compiled_endpoint_limits)
+        )) if self.compiled_endpoint_limits else None
 
-        self.allowed_bot_patterns = []
-        for pattern in waf_config.allowed_bots:
-            try:
-                self.allowed_bot_patterns.append(re.compile(pattern, re.IGNORECASE))
-            except re.error:
-                logger.error(f"Invalid allowed bot pattern: {pattern}")
+        # Compile each User-Agent pattern list into one matcher: literal
+        # substrings plus a single alternation for the real regexes
+        self.blocked_ua_patterns = _compile_any(waf_config.blocked_user_agents, "User-Agent")
+        self.bot_patterns = _compile_any(waf_config.bot_detection_patterns, "bot")
+        self.allowed_bot_patterns = _compile_any(waf_config.allowed_bots, "allowed bot")
 
         # Per-endpoint rate limiting storage
-        # {(ip, endpoint): (tokens, last_refill)}
-        self.endpoint_buckets: Dict[Tuple[str, str], Tuple[float, float]] = defaultdict(
-            lambda: (0, time.time())
+        # {(ip, endpoint): [millitokens, last_refill_ms]} - new buckets start full.
+        # Integer millitokens and monotonic milliseconds keep the refill free of
+        # float math and immune to wall-clock jumps.
+        self.endpoint_buckets = _EndpointBuckets(
+            {limit.endpoint_pattern: limit.burst_size * 1000 for _, limit in self.compiled_endpoint_limits}
         )
 
+        # Pre-encoded signature block bodies: {(category, severity): body}
+        self.signature_block_responses: Dict[Tuple[str, str], _PreparedResponse] = {}
+
         logger.info("Enhanced WAF middleware initialized")
 
-    def _check_user_agent(self, request: Request) -> Optional[JSONResponse]:
+    def _check_user_agent(self, user_agent: str, client_ip: str) -> Optional[ASGIApp]:
         """Check User-Agent header for suspicious patterns"""
-        if not waf_config.enable_user_agent_filtering:
+        if not self.waf_config.enable_user_agent_filtering:
             return None
 
-        user_agent = request.headers.get("User-Agent", "")
-
         # Require User-Agent header
-        if waf_config.require_user_agent and not user_agent:
-            logger.warning(f"Missing User-Agent from {extract_client_ip(request)}")
-            metrics_module.gateway_waf_blocks_total.labels(reason="missing_user_agent").inc()
-            return JSONResponse(
-                status_code=status.HTTP_403_FORBIDDEN,
-                content={
-                    "error": "Forbidden",
-                    "message": "User-Agent header required",
-                    "blocked_by": "WAF"
-                }
-            )
+        if self.waf_config.require_user_agent and not user_agent:
+            logger.warning(f"Missing User-Agent from {client_ip}")
+            metrics_module.track_waf_block("missing_user_agent")
+            return _block_response("missing_user_agent")
 
         # Check against blocked User-Agents
-        for pattern in self.blocked_ua_patterns:
-            if pattern.search(user_agent):
-                logger.warning(
-                    f"Blocked User-Agent: {user_agent[:100]} from {extract_client_ip(request)}"
-                )
-                metrics_module.gateway_waf_blocks_total.labels(reason="malicious_user_agent").inc()
-                return JSONResponse(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    content={
-                        "error": "Forbidden",
-                        "message": "Malicious User-Agent detected",
-                        "blocked_by": "WAF"
-                    }
-                )
-
-        # Bot detection
-        if waf_config.enable_bot_detection:
-            # Check if it's an allowed bot first
-            is_allowed_bot = any(
-                pattern.search(user_agent)
-                for pattern in self.allowed_bot_patterns
+        if self.blocked_ua_patterns and self.blocked_ua_patterns.search(user_agent):
+            logger.warning(
+                f"Blocked User-Agent: {user_agent[:100]} from {client_ip}"
             )
-
-            if not is_allowed_bot:
-                # Check for bot patterns
-                for pattern in self.bot_patterns:
-                    if pattern.search(user_agent):
-                        logger.warning(
-                            f"Suspicious bot detected: {user_agent[:100]} from {extract_client_ip(request)}"
-                        )
-                        metrics_module.gateway_waf_blocks_total.labels(reason="suspicious_bot").inc()
-                        return JSONResponse(
-                            status_code=status.HTTP_403_FORBIDDEN,
-                            content={
-                                "error": "Forbidden",
-                                "message": "Automated bot traffic not allowed",
-                                "blocked_by": "WAF"
-                            }
-                        )
+            metrics_module.track_waf_block("malicious_user_agent")
+            return _block_response("malicious_user_agent")
+
+        # Bot detection (allowed bots are checked first)
+        if (
+            self.waf_config.enable_bot_detection
+            and self.bot_patterns
+            and not (self.allowed_bot_patterns and self.allowed_bot_patterns.search(user_agent))
+            and self.bot_patterns.search(user_agent)
+        ):
+            logger.warning(
+                f"Suspicious bot detected: {user_agent[:100]} from {client_ip}"
+            )
+            metrics_module.track_waf_block("suspicious_bot")
+            return _block_response("suspicious_bot")
 
         return None
 
-    def _check_signature_scan(self, request: Request, body: bytes = None) -> Optional[JSONResponse]:
-        """Scan request for attack signatures"""
-        if not waf_config.enable_signature_detection:
+    def _check_signature_scan(
+        self,
+        query_string: bytes,
+        header_targets: List[Tuple[bytes, bytes]],
+        client_ip: str,
+        body: bytes = None
+    ) -> Optional[ASGIApp]:
+        """Scan request for attack signatures (header_targets are pre-filtered)"""
+        if not self.waf_config.enable_signature_detection:
             return None
 
+        # (label, text) pairs. Query and header values stay raw bytes for the
+        # scanner; header labels are bytes until a match is logged.
         scan_targets = []
 
         # Scan query parameters
-        if waf_config.signature_scan_query:
-            query_string = str(request.url.query)
+        if self.waf_config.signature_scan_query:
+            # Raw query from the scope: no URL parsing, and a stray '#' cannot
+            # hide the rest of the query as a "fragment"
             if query_string:
                 scan_targets.append(("query", query_string))
 
         # Scan headers
-        if waf_config.signature_scan_headers:
-            for key, value in request.headers.items():
-                # Skip common headers (including origin/referer which contain localhost in dev)
-                if key.lower() not in ["host", "user-agent", "accept", "connection", "origin", "referer", "referrer"]:
-                    scan_targets.append((f"header:{key}", value))
-
-        # Scan body (if provided and enabled)
-        if waf_config.signature_scan_body and body:
-            if len(body) <= waf_config.max_scan_body_size:
-                try:
-                    body_str = body.decode("utf-8", errors="ignore")
-                    scan_targets.append(("body", body_str))
-                except Exception:
-                    pass
+        if self.waf_config.signature_scan_headers:
+            scan_targets.extend(header_targets)
+
+        # Scan body (if provided and enabled). Larger bodies have their first
+        # max_scan_body_size bytes scanned, so only that prefix is decoded.
+        max_scan = self.waf_config.max_scan_body_size
+        if self.waf_config.signature_scan_body and body:
+            scan_targets.append(("body", body[:max_scan].decode("utf-8", errors="ignore")))
 
-        # Perform signature scanning
+        # Perform signature scanning (each target bounded to max_scan)
         for target_type, target_value in scan_targets:
-            result = signature_db.scan_detailed(target_value)
+            result = signature_db.scan_detailed(target_value, max_length=max_scan)
 
             if result["threat_detected"]:
-                client_ip = extract_client_ip(request)
+                if isinstance(target_type, bytes):
+                    target_type = f"header:{target_type.decode('latin-1')}"
                 highest_match = result["matches"][0]
 
                 logger.warning(
@@ -284,186 +521,255 @@ class RequestValidationMiddleware(BaseHTTPMiddleware):
                 )
 
                 # Update metrics
-                metrics_module.gateway_waf_blocks_total.labels(
-                    reason=highest_match['category']
-                ).inc()
+                metrics_module.track_waf_block(highest_match['category'])
 
                 metrics_module.gateway_waf_suspicious_patterns.labels(
                     pattern=highest_match['category'],
                     client_ip=client_ip
                 ).inc()
 
-                return JSONResponse(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    content={
-                        "error": "Bad Request",
-                        "message": f"Attack pattern detected: {highest_match['category']}",
-                        "blocked_by": "WAF",
-                        "severity": highest_match['severity']
-                    }
-                )
+                # Bodies only vary by category and severity, so encode each once
+                key = (highest_match['category'], highest_match['severity'])
+                response = self.signature_block_responses.get(key)
+                if response is None:
+                    response = self.signature_block_responses[key] = _PreparedResponse(
+                        status.HTTP_400_BAD_REQUEST,
+                        orjson.dumps({
+                            "error": "Bad Request",
+                            "message": f"Attack pattern detected: {key[0]}",
+                            "blocked_by": "WAF",
+                            "severity": key[1]
+                        })
+                    )
+                return response
 
         return None
 
-    def _check_endpoint_rate_limit(self, request: Request) -> Optional[JSONResponse]:
+    def _check_endpoint_rate_limit(self, path: str, client_ip: str) -> Optional[ASGIApp]:
         """Check per-endpoint rate limiting"""
-        if not waf_config.enable_endpoint_rate_limiting:
+        if not self.waf_config.enable_endpoint_rate_limiting:
             return None
 
-        path = request.url.path
-        client_ip = extract_client_ip(request)
-
         # Find matching endpoint limit
-        for pattern, limit in self.compiled_endpoint_limits:
-            if pattern.match(path):
-                # Get or create bucket for this IP+endpoint combo
-                bucket_key = (client_ip, limit.endpoint_pattern)
-                tokens, last_refill = self.endpoint_buckets[bucket_key]
-
-                # Initialize bucket if first request
-                if tokens == 0 and last_refill == self.endpoint_buckets.default_factory()[1]:
-                    tokens = limit.burst_size
-
-                # Refill tokens
-                now = time.time()
-                time_elapsed = now - last_refill
-                refill_rate = limit.requests_per_minute / 60.0
-                tokens_to_add = time_elapsed * refill_rate
-                tokens = min(limit.burst_size, tokens + tokens_to_add)
-
-                # Try to consume token
-                if tokens >= 1.0:
-                    self.endpoint_buckets[bucket_key] = (tokens - 1.0, now)
-                    return None  # Allow request
-                else:
-                    # Rate limited for this endpoint
-                    self.endpoint_buckets[bucket_key] = (tokens, now)
-                    logger.warning(
-                        f"Endpoint rate limit exceeded: {path} from {client_ip}"
-                    )
+        match = self.endpoint_limit_regex.match(path) if self.endpoint_limit_regex else None
+        if match is None:
+            return None
+        limit = self.endpoint_limits_by_group[match.lastgroup]
+
+        # Get or create bucket for this IP+endpoint combo
+        bucket_key = (client_ip, limit.endpoint_pattern)
+        bucket = self.endpoint_buckets[bucket_key]
+        self.endpoint_buckets.move_to_end(bucket_key)
+
+        # Lazy refill (millitokens per ms = rpm * 1000 / 60000). The
+        # clock only advances once a whole millitoken has accrued, so
+        # bursts inside one refill step skip the update and lose nothing.
+        now_ms = time.monotonic_ns() // 1_000_000
+        tokens_mt = bucket[0]
+        added_mt = (now_ms - bucket[1]) * limit.requests_per_minute // 60
+        if added_mt:
+            tokens_mt += added_mt
+            capacity_mt = limit.burst_size * 1000
+            if tokens_mt > capacity_mt:
+                tokens_mt = capacity_mt
+            bucket[1] = now_ms
+
+        # Try to consume token
+        if tokens_mt >= 1000:
+            bucket[0] = tokens_mt - 1000
+            return None  # Allow request
+        else:
+            # Rate limited for this endpoint
+            bucket[0] = tokens_mt
+            logger.warning(
+                f"Endpoint rate limit exceeded: {path} from {client_ip}"
+            )
 
-                    metrics_module.gateway_rate_limit_blocks_total.labels(
-                        client_ip=client_ip
-                    ).inc()
-
-                    return JSONResponse(
-                        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                        content={
-                            "error": "Rate Limit Exceeded",
-                            "message": f"Too many requests to this endpoint. Limit: {limit.requests_per_minute} req/min",
-                            "endpoint": path,
-                            "retry_after": 60
-                        },
-                        headers={"Retry-After": "60"}
-                    )
+            metrics_module.gateway_rate_limit_blocks_total.labels(
+                client_ip=client_ip
+            ).inc()
 
-        return None
+            return ORJSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={
+                    "error": "Rate Limit Exceeded",
+                    "message": f"Too many requests to this endpoint. Limit: {limit.requests_per_minute} req/min",
+                    "endpoint": path,
+                    "retry_after": 60
+                },
+                headers={"Retry-After": "60"}
+            )
 
-    async def dispatch(self, request: Request, call_next):
-        """Enhanced WAF validation"""
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        """Validate, process and log the request"""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Start timer
+        start_time = time.perf_counter()
+        request = Request(scope)
 
         # Skip WAF for health/metrics endpoints
-        if request.url.path in ["/health", "/metrics"]:
-            return await call_next(request)
+        internal = scope["path"] in INTERNAL_PATHS
+        block_response = None if internal else self._validate(request)
+
+        # Add WAF headers (for debugging) only to requests that passed the WAF
+        if block_response is None and not internal and self.waf_config.add_waf_headers:
+            extra_headers = WAF_PASSED_HEADERS
+        else:
+            extra_headers = ()
+
+        status_code = 500
+        duration_str = ""
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code, duration_str
+            if message["type"] == "http.response.start":
+                # Calculate duration and add timing header
+                status_code = message["status"]
+                duration_str = format(time.perf_counter() - start_time, ".3f")
+                raw = list(message.get("headers", ()))
+                _set_raw_headers(raw, extra_headers + (
+                    (b"x-response-time", (duration_str + "s").encode("latin-1")),
+                ))
+                message["headers"] = raw
+            await send(message)
 
-        # 1. Check User-Agent
-        ua_response = self._check_user_agent(request)
+        # Process request
+        if block_response is not None:
+            await block_response(scope, receive, send_with_timing)
+        else:
+            await self.app(scope, receive, send_with_timing)
+
+        # Log request (only formatted when INFO is enabled)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "%s %s - Status: %d - IP: %s - Duration: %ss",
+                scope["method"],
+                scope["path"],
+                status_code,
+                request.state.client_ip,
+                duration_str
+            )
+
+    def _validate(self, request: Request) -> Optional[ASGIApp]:
+        """
+        Enhanced WAF validation
+        Collects everything the checks need in one pass over the raw headers,
+        then runs the checks on those values.
+        Returns the block response, or None if the request passed every check
+        """
+        scope = request.scope
+        client_ip = _client_ip(scope)
+        scan_headers = self.waf_config.enable_signature_detection and self.waf_config.signature_scan_headers
+
+        user_agent = None
+        content_length = None
+        header_targets = []
+        for key, value in scope["headers"]:
+            if key == b"user-agent":
+                if user_agent is None:
+                    user_agent = value.decode("latin-1")
+                continue
+            if key == b"content-length" and content_length is None:
+                try:
+                    content_length = int(value)
+                except ValueError:
+                    pass
+            if scan_headers and key not in SKIP_SCAN_HEADERS:
+                header_targets.append((key, value))
+
+        # 1. Check request size limits (a single int compare, so it goes first)
+        if content_length is not None and content_length > self.waf_config.max_request_body_size:
+            logger.warning(
+                f"Oversized request blocked: {content_length} bytes "
+                f"from IP {client_ip}"
+            )
+            metrics_module.track_waf_block("oversized_request")
+            return _block_response("oversized_request")
+
+        # 2. Check User-Agent
+        ua_response = self._check_user_agent(user_agent or "", client_ip)
         if ua_response:
             return ua_response
 
-        # 2. Check request size limits
-        content_length = request.headers.get("content-length")
-        if content_length:
-            try:
-                if int(content_length) > waf_config.max_request_body_size:
-                    logger.warning(
-                        f"Oversized request blocked: {content_length} bytes "
-                        f"from IP {extract_client_ip(request)}"
-                    )
-                    metrics_module.gateway_waf_blocks_total.labels(reason="oversized_request").inc()
-                    return JSONResponse(
-                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                        content={
-                            "error": "Request Entity Too Large",
-                            "message": f"Request body exceeds maximum size",
-                            "blocked_by": "WAF"
-                        }
-                    )
-            except ValueError:
-                pass
-
         # 3. Check URL length
-        if len(str(request.url)) > waf_config.max_url_length:
-            logger.warning(f"Oversized URL blocked from {extract_client_ip(request)}")
-            metrics_module.gateway_waf_blocks_total.labels(reason="oversized_url").inc()
-            return JSONResponse(
-                status_code=status.HTTP_414_REQUEST_URI_TOO_LONG,
-                content={
-                    "error": "URI Too Long",
-                    "message": "URL exceeds maximum length",
-                    "blocked_by": "WAF"
-                }
-            )
+        if len(str(request.url)) > self.waf_config.max_url_length:
+            logger.warning(f"Oversized URL blocked from {client_ip}")
+            metrics_module.track_waf_block("oversized_url")
+            return _block_response("oversized_url")
 
         # 4. Signature-based scanning (without body first)
-        sig_response = self._check_signature_scan(request)
+        sig_response = self._check_signature_scan(
+            scope["query_string"], header_targets, client_ip
+        )
         if sig_response:
             return sig_response
 
         # 5. Per-endpoint rate limiting
-        endpoint_rate_response = self._check_endpoint_rate_limit(request)
+        endpoint_rate_response = self._check_endpoint_rate_limit(scope["path"], client_ip)
         if endpoint_rate_response:
             return endpoint_rate_response
 
         # 6. Validate HTTP method
-        allowed_methods = ["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS", "HEAD"]
-        if request.method not in allowed_methods:
-            metrics_module.gateway_waf_blocks_total.labels(reason="invalid_method").inc()
-            return JSONResponse(
+        method = scope["method"]
+        if method not in ALLOWED_METHODS:
+            metrics_module.track_waf_block("invalid_method")
+            return ORJSONResponse(
                 status_code=status.HTTP_405_METHOD_NOT_ALLOWED,
                 content={
                     "error": "Method Not Allowed",
-                    "message": f"HTTP method {request.method} is not allowed"
+                    "message": f"HTTP method {method} is not allowed"
                 }
             )
 
         # Request passed all WAF checks
-        response = await call_next(request)
+        return None
 
-        # Add WAF headers (for debugging)
-        if waf_config.add_waf_headers:
-            response.headers["X-WAF-Status"] = "passed"
-            response.headers["X-WAF-Version"] = "2.5A"
 
-        return response
+class StaticHoneypotMiddleware:
+    """
+    Serve static honeypot bodies straight from HONEYPOT_TABLE
 
+    Pure ASGI middleware: GET requests to a known honeypot path are answered
+    with pre-encoded bytes and headers, skipping routing and request parsing.
+    Hit tracking is queued for the honeypot consumer. Everything else, including POSTs
+    to honeypot paths, falls through to the FastAPI routes.
+    """
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    """Log all requests and responses with timing"""
-    
-    async def dispatch(self, request: Request, call_next):
-        # Start timer
-        start_time = time.time()
-        
-        # Get client info
-        client_ip = extract_client_ip(request)
-        
-        # Process request
-        response = await call_next(request)
-        
-        # Calculate duration
-        duration = time.time() - start_time
-        
-        # Log request
-        logger.info(
-            f"{request.method} {request.url.path} - "
-            f"Status: {response.status_code} - "
-            f"IP: {client_ip} - "
-            f"Duration: {duration:.3f}s"
-        )
-        
-        # Add timing header
-        response.headers["X-Response-Time"] = f"{duration:.3f}s"
-        
-        return response
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+        # {path: (raw_headers, body, honeypot_type, severity)}
+        self.responses = {
+            path: (
+                [
+                    (b"content-type", content_type.encode("latin-1")),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                ],
+                body,
+                honeypot_type,
+                severity,
+            )
+            for path, (body, content_type, honeypot_type, severity) in HONEYPOT_TABLE.items()
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        entry = self.responses.get(scope["path"])
+        if entry is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers, body, honeypot_type, severity = entry
+
+        # Only enqueues the hit - the honeypot consumer applies it in the background
+        await track_honeypot_hit(Request(scope), honeypot_type, severity=severity)
 
+        # Outer layers (e.g. CORS) may mutate the header list in place, so copy it
+        await send({"type": "http.response.start", "status": 200, "headers": list(headers)})
+        await send({"type": "http.response.body", "body": body})
@@ -2,15 +2,23 @@
 Security utilities for API Gateway
 JWT verification, authentication, and authorization
 """
+import hashlib
 import logging
-from typing import Optional, Dict, Any
-from datetime import datetime, timezone
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
 from fastapi import Header, HTTPException, status, Request
-from jose import JWTError, jwt
+import jwt
+from jwt import PyJWTError
 from .config import settings
 
 logger = logging.getLogger(__name__)
 
+# Recently verified access tokens, LRU of blake2b(token) -> (payload, exp).
+# Active sessions send the same token on every request; a hit skips the HMAC.
+JWT_CACHE_SIZE = 4096
+_jwt_cache: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+
 
 class JWTValidator:
     """JWT token validation and verification"""
@@ -29,12 +37,22 @@ class JWTValidator:
         Raises:
             HTTPException: If token is invalid or expired
         """
+        key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        cached = _jwt_cache.get(key)
+        if cached is not None:
+            if time.time() < cached[1]:
+                _jwt_cache.move_to_end(key)
+                return cached[0]
+            # Expired - drop it and let the full decode produce the error
+            del _jwt_cache[key]
+
         try:
-            # Decode and verify token
+            # Decode and verify token (PyJWT checks signature and expiration)
             payload = jwt.decode(
                 token,
                 settings.SECRET_KEY,
-                algorithms=[settings.JWT_ALGORITHM]
+                algorithms=[settings.JWT_ALGORITHM],
+                options={"require": ["exp"]}
             )
             
             # Verify token type
@@ -46,28 +64,16 @@ class JWTValidator:
                     headers={"WWW-Authenticate": "Bearer"},
                 )
             
-            # Verify expiration
-            exp = payload.get("exp")
-            if exp is None:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token missing expiration claim",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-            
-            # Check if expired
-            current_time = datetime.now(timezone.utc).timestamp()
-            if current_time > exp:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token has expired",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-            
-            logger.info(f"JWT verified for user: {payload.get('sub')}")
+            # Logged on every authenticated request - only format when INFO is on
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("JWT verified for user: %s", payload.get("sub"))
+
+            _jwt_cache[key] = (payload, payload["exp"])
+            if len(_jwt_cache) > JWT_CACHE_SIZE:
+                _jwt_cache.popitem(last=False)
             return payload
             
-        except JWTError as e:
+        except PyJWTError as e:
             logger.warning(f"JWT verification failed: {e}")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -137,7 +143,9 @@ async def optional_auth(authorization: Optional[str] = Header(None)) -> Optional
 def extract_client_ip(request: Request) -> str:
     """
     Extract client IP address from request
-    Checks X-Forwarded-For header first (for proxy scenarios)
+    Checks X-Forwarded-For header first (for proxy scenarios).
+    The result is cached in the request state, so later calls for the
+    same request skip the header parsing.
     
     Args:
         request: FastAPI request object
@@ -145,15 +153,22 @@ def extract_client_ip(request: Request) -> str:
     Returns:
         Client IP address
     """
+    state = request.scope.setdefault("state", {})
+    client_ip = state.get("client_ip")
+    if client_ip is not None:
+        return client_ip
+    
     # Check X-Forwarded-For header (set by reverse proxies)
     forwarded_for = request.headers.get("X-Forwarded-For")
     if forwarded_for:
         # X-Forwarded-For can contain multiple IPs, take the first one
-        return forwarded_for.split(",")[0].strip()
-    
-    # Fallback to direct client IP
-    if request.client:
-        return request.client.host
+        client_ip = forwarded_for.split(",")[0].strip()
+    elif request.client:
+        # Fallback to direct client IP
+        client_ip = request.client.host
+    else:
+        client_ip = "unknown"
     
-    return "unknown"
+    state["client_ip"] = client_ip
+    return client_ip
 
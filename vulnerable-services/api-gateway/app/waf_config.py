@@ -7,12 +7,14 @@ Centralized configuration for WAF features including:
 - User-Agent filtering
 - Bot detection
 """
-from typing import Dict, List, Set, Optional
+import os
+from functools import lru_cache
+from typing import Dict, Mapping, Set, Optional, Tuple
 from dataclasses import dataclass, field
-from pydantic_settings import BaseSettings
+from dotenv import dotenv_values
 
 
-@dataclass
+@dataclass(frozen=True)
 class EndpointRateLimit:
     """Per-endpoint rate limit configuration"""
     endpoint_pattern: str  # Regex pattern
@@ -21,6 +23,103 @@ class EndpointRateLimit:
     description: str = ""
 
 
+# ============================================================================
+# Default Rule Sets
+# ============================================================================
+# Never mutated at runtime, so every WAFConfig shares these tuples
+
+DEFAULT_ENDPOINT_RATE_LIMITS = (
+    # Authentication endpoints (stricter limits)
+    EndpointRateLimit(
+        endpoint_pattern=r"^/auth/login$",
+        requests_per_minute=10,
+        burst_size=3,
+        description="Login endpoint - prevent brute force"
+    ),
+    EndpointRateLimit(
+        endpoint_pattern=r"^/auth/mfa/verify$",
+        requests_per_minute=15,
+        burst_size=5,
+        description="MFA verification - prevent bypass attempts"
+    ),
+    EndpointRateLimit(
+        endpoint_pattern=r"^/auth/token/refresh$",
+        requests_per_minute=20,
+        burst_size=5,
+        description="Token refresh - moderate limit"
+    ),
+
+    # User service endpoints
+    EndpointRateLimit(
+        endpoint_pattern=r"^/api/users/profile/\d+$",
+        requests_per_minute=30,
+        burst_size=10,
+        description="User profile access - prevent IDOR enumeration"
+    ),
+    EndpointRateLimit(
+        endpoint_pattern=r"^/api/users/settings$",
+        requests_per_minute=20,
+        burst_size=5,
+        description="Settings endpoint"
+    ),
+
+    # Honeypot endpoints (very strict)
+    EndpointRateLimit(
+        endpoint_pattern=r"^/(admin|phpmyadmin|wp-admin|\.env|\.git)",
+        requests_per_minute=5,
+        burst_size=2,
+        description="Honeypot endpoints - aggressive rate limiting"
+    ),
+)
+
+DEFAULT_BLOCKED_USER_AGENTS = (
+    # Scanners
+    r"nikto",
+    r"nmap",
+    r"masscan",
+    r"zgrab",
+    r"sqlmap",
+    r"havij",
+    r"acunetix",
+    r"nessus",
+    r"openvas",
+    r"w3af",
+    r"burp",
+    r"metasploit",
+
+    # Scrapers (aggressive)
+    r"scrapy",
+    r"python-requests(?!/)", # Block bare python-requests
+    r"curl(?!/)",  # Block bare curl
+    r"wget(?!/)",  # Block bare wget
+
+    # Known bad bots
+    r"semrush",
+    r"ahrefs",
+    r"mj12bot",
+    r"dotbot",
+)
+
+DEFAULT_BOT_DETECTION_PATTERNS = (
+    r"bot",
+    r"crawler",
+    r"spider",
+    r"scraper",
+    r"scan",
+)
+
+DEFAULT_ALLOWED_BOTS = (
+    r"googlebot",
+    r"bingbot",
+    r"duckduckbot",
+    r"slackbot",
+    r"twitterbot",
+    r"facebookexternalhit",
+    r"uptimerobot",
+    r"pingdom",
+)
+
+
 @dataclass
 class WAFConfig:
     """WAF configuration container"""
@@ -38,49 +137,7 @@ class WAFConfig:
     # Per-Endpoint Rate Limiting
     # ========================================================================
     enable_endpoint_rate_limiting: bool = True
-    endpoint_rate_limits: List[EndpointRateLimit] = field(default_factory=lambda: [
-        # Authentication endpoints (stricter limits)
-        EndpointRateLimit(
-            endpoint_pattern=r"^/auth/login$",
-            requests_per_minute=10,
-            burst_size=3,
-            description="Login endpoint - prevent brute force"
-        ),
-        EndpointRateLimit(
-            endpoint_pattern=r"^/auth/mfa/verify$",
-            requests_per_minute=15,
-            burst_size=5,
-            description="MFA verification - prevent bypass attempts"
-        ),
-        EndpointRateLimit(
-            endpoint_pattern=r"^/auth/token/refresh$",
-            requests_per_minute=20,
-            burst_size=5,
-            description="Token refresh - moderate limit"
-        ),
-
-        # User service endpoints
-        EndpointRateLimit(
-            endpoint_pattern=r"^/api/users/profile/\d+$",
-            requests_per_minute=30,
-            burst_size=10,
-            description="User profile access - prevent IDOR enumeration"
-        ),
-        EndpointRateLimit(
-            endpoint_pattern=r"^/api/users/settings$",
-            requests_per_minute=20,
-            burst_size=5,
-            description="Settings endpoint"
-        ),
-
-        # Honeypot endpoints (very strict)
-        EndpointRateLimit(
-            endpoint_pattern=r"^/(admin|phpmyadmin|wp-admin|\.env|\.git)",
-            requests_per_minute=5,
-            burst_size=2,
-            description="Honeypot endpoints - aggressive rate limiting"
-        ),
-    ])
+    endpoint_rate_limits: Tuple[EndpointRateLimit, ...] = DEFAULT_ENDPOINT_RATE_LIMITS
 
     # ========================================================================
     # Geo-Blocking
@@ -96,33 +153,7 @@ class WAFConfig:
     enable_user_agent_filtering: bool = True
 
     # Known malicious User-Agents
-    blocked_user_agents: List[str] = field(default_factory=lambda: [
-        # Scanners
-        r"nikto",
-        r"nmap",
-        r"masscan",
-        r"zgrab",
-        r"sqlmap",
-        r"havij",
-        r"acunetix",
-        r"nessus",
-        r"openvas",
-        r"w3af",
-        r"burp",
-        r"metasploit",
-
-        # Scrapers (aggressive)
-        r"scrapy",
-        r"python-requests(?!/)", # Block bare python-requests
-        r"curl(?!/)",  # Block bare curl
-        r"wget(?!/)",  # Block bare wget
-
-        # Known bad bots
-        r"semrush",
-        r"ahrefs",
-        r"mj12bot",
-        r"dotbot",
-    ])
+    blocked_user_agents: Tuple[str, ...] = DEFAULT_BLOCKED_USER_AGENTS
 
     # Require User-Agent header
     require_user_agent: bool = True
@@ -133,25 +164,10 @@ class WAFConfig:
     enable_bot_detection: bool = True
 
     # Suspicious patterns in User-Agent
-    bot_detection_patterns: List[str] = field(default_factory=lambda: [
-        r"bot",
-        r"crawler",
-        r"spider",
-        r"scraper",
-        r"scan",
-    ])
+    bot_detection_patterns: Tuple[str, ...] = DEFAULT_BOT_DETECTION_PATTERNS
 
     # Allowed good bots (search engines, monitoring)
-    allowed_bots: List[str] = field(default_factory=lambda: [
-        r"googlebot",
-        r"bingbot",
-        r"duckduckbot",
-        r"slackbot",
-        r"twitterbot",
-        r"facebookexternalhit",
-        r"uptimerobot",
-        r"pingdom",
-    ])
+    allowed_bots: Tuple[str, ...] = DEFAULT_ALLOWED_BOTS
 
     # ========================================================================
     # Request Size Limits
@@ -172,59 +188,61 @@ class WAFConfig:
     add_waf_headers: bool = True  # Add X-WAF-* headers for debugging
 
 
-class WAFSettings(BaseSettings):
-    """WAF settings from environment variables"""
-
-    # Global WAF toggle
-    WAF_ENABLED: bool = True
+# Accepted spellings for boolean WAF_* environment variables
+_TRUE_VALUES = frozenset(("1", "true", "yes", "on", "t", "y"))
+_FALSE_VALUES = frozenset(("0", "false", "no", "off", "f", "n"))
 
-    # Feature toggles
-    WAF_SIGNATURE_DETECTION: bool = True
-    WAF_ENDPOINT_RATE_LIMITING: bool = True
-    WAF_GEO_BLOCKING: bool = False
-    WAF_USER_AGENT_FILTERING: bool = True
-    WAF_BOT_DETECTION: bool = True
 
-    # Geo-blocking settings
-    WAF_GEO_BLOCK_COUNTRIES: str = ""  # Comma-separated ISO codes
-    WAF_GEO_ALLOW_COUNTRIES: str = ""  # Comma-separated ISO codes
-    WAF_GEO_WHITELIST_MODE: bool = False
+def _env_bool(env: Mapping[str, str], name: str, default: bool) -> bool:
+    """Read a boolean environment variable; unknown values are an error"""
+    value = env.get(name)
+    if value is None:
+        return default
+    value = value.strip().lower()
+    if value in _TRUE_VALUES:
+        return True
+    if value in _FALSE_VALUES:
+        return False
+    raise ValueError(f"{name} must be a boolean, got {value!r}")
 
-    # Debug mode
-    WAF_DEBUG: bool = False
 
-    class Config:
-        env_file = ".env"
-
-
-def load_waf_config() -> WAFConfig:
-    """Load WAF configuration from environment"""
-    settings = WAFSettings()
+def _load_waf_config_uncached() -> WAFConfig:
+    """Load WAF configuration from environment (and an optional .env file)"""
+    # Real environment variables take precedence over .env entries
+    env = {key: value for key, value in dotenv_values(".env").items() if value is not None}
+    env.update(os.environ)
 
     config = WAFConfig()
 
-    # Apply environment overrides
-    config.enable_signature_detection = settings.WAF_SIGNATURE_DETECTION
-    config.enable_endpoint_rate_limiting = settings.WAF_ENDPOINT_RATE_LIMITING
-    config.enable_geo_blocking = settings.WAF_GEO_BLOCKING
-    config.enable_user_agent_filtering = settings.WAF_USER_AGENT_FILTERING
-    config.enable_bot_detection = settings.WAF_BOT_DETECTION
+    # Apply environment overrides (feature toggles)
+    config.enable_signature_detection = _env_bool(env, "WAF_SIGNATURE_DETECTION", True)
+    config.enable_endpoint_rate_limiting = _env_bool(env, "WAF_ENDPOINT_RATE_LIMITING", True)
+    config.enable_geo_blocking = _env_bool(env, "WAF_GEO_BLOCKING", False)
+    config.enable_user_agent_filtering = _env_bool(env, "WAF_USER_AGENT_FILTERING", True)
+    config.enable_bot_detection = _env_bool(env, "WAF_BOT_DETECTION", True)
 
-    # Parse geo-blocking lists
-    if settings.WAF_GEO_BLOCK_COUNTRIES:
-        config.geo_block_countries = set(
-            settings.WAF_GEO_BLOCK_COUNTRIES.upper().split(",")
-        )
+    # Parse geo-blocking lists (comma-separated ISO codes)
+    geo_block_countries = env.get("WAF_GEO_BLOCK_COUNTRIES", "")
+    if geo_block_countries:
+        config.geo_block_countries = set(geo_block_countries.upper().split(","))
 
-    if settings.WAF_GEO_ALLOW_COUNTRIES:
-        config.geo_allow_countries = set(
-            settings.WAF_GEO_ALLOW_COUNTRIES.upper().split(",")
-        )
+    geo_allow_countries = env.get("WAF_GEO_ALLOW_COUNTRIES", "")
+    if geo_allow_countries:
+        config.geo_allow_countries = set(geo_allow_countries.upper().split(","))
 
-    config.geo_whitelist_mode = settings.WAF_GEO_WHITELIST_MODE
+    config.geo_whitelist_mode = _env_bool(env, "WAF_GEO_WHITELIST_MODE", False)
 
     return config
 
 
-# Global WAF configuration
-waf_config = load_waf_config()
+@lru_cache(maxsize=1)
+def load_waf_config() -> WAFConfig:
+    """
+    Shared WAF configuration, loaded on first use
+    Callers resolve it when needed (GatewayMiddleware when the middleware
+    stack is built), so importing this module reads neither the environment
+    nor .env.
+    Call load_waf_config.cache_clear() before building a new app to re-read
+    the environment and .env (tests).
+    """
+    return _load_waf_config_uncached()
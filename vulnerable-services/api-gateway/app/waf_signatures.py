@@ -5,10 +5,27 @@ This module contains signature-based attack detection patterns for the WAF.
 Signatures are organized by attack category and severity.
 """
 import re
-from typing import Dict, List, Tuple, Optional
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, Tuple, Optional, Union
 from dataclasses import dataclass
 from enum import Enum
 
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+# scan() results are cached per text: User-Agents, bot probes and common
+# query strings repeat constantly. Long texts (bodies) are not cached.
+SCAN_CACHE_SIZE = 4096
+SCAN_CACHE_MAX_TEXT = 4096
+
+# ASCII characters that Unicode \s matches but ASCII-mode \s does not.
+# Text containing them must use the Unicode-mode patterns.
+_UNICODE_ONLY_SPACE = re.compile("[\x1c-\x1f]")
+_UNICODE_ONLY_SPACE_BYTES = re.compile(b"[\x1c-\x1f]")
+
 
 class AttackCategory(str, Enum):
     """Attack category classification"""
@@ -32,6 +49,132 @@ class Severity(str, Enum):
     CRITICAL = "critical"
 
 
+# Sort order for severities (higher = more severe)
+SEVERITY_RANK = {
+    Severity.LOW: 1,
+    Severity.MEDIUM: 2,
+    Severity.HIGH: 3,
+    Severity.CRITICAL: 4,
+}
+
+
+def _collect_first_chars(items, out: set) -> bool:
+    """
+    Add every character a parsed pattern can start with to out
+    Returns True if the pattern can match the empty string (the caller must
+    then also consider what follows); raises ValueError for constructs
+    whose first character cannot be enumerated cheaply (., \\w, ...)
+    """
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            out.add(chr(av))
+            return False
+        if op is sre_constants.IN:
+            for item_op, item_av in av:
+                if item_op is sre_constants.LITERAL:
+                    out.add(chr(item_av))
+                elif item_op is sre_constants.RANGE and item_av[1] - item_av[0] < 256:
+                    out.update(chr(c) for c in range(item_av[0], item_av[1] + 1))
+                else:
+                    raise ValueError("unsupported character set")
+            return False
+        if op is sre_constants.AT:
+            continue  # zero-width anchor (\b, ^, $)
+        if op is sre_constants.SUBPATTERN:
+            if not _collect_first_chars(av[-1], out):
+                return False
+            continue
+        if op is sre_constants.BRANCH:
+            can_be_empty = False
+            for alternative in av[1]:
+                can_be_empty |= _collect_first_chars(alternative, out)
+            if not can_be_empty:
+                return False
+            continue
+        if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            min_count, _, sub = av
+            if not _collect_first_chars(sub, out) and min_count > 0:
+                return False
+            continue
+        raise ValueError(f"unsupported construct: {op}")
+    return True
+
+
+def first_chars(pattern: str) -> Optional[FrozenSet[str]]:
+    """
+    Characters a case-insensitive match of pattern must start with
+    Returns None if they cannot be determined (pattern is always scanned)
+    """
+    chars: set = set()
+    try:
+        if _collect_first_chars(sre_parse.parse(pattern, re.IGNORECASE), chars):
+            return None
+    except ValueError:
+        return None
+    if not all(c.isascii() for c in chars):
+        return None
+    return frozenset(chars | {c.swapcase() for c in chars})
+
+
+def _required_literals(items) -> Optional[FrozenSet[str]]:
+    """
+    Lowercase literals of which every match of a parsed sequence contains at
+    least one, or None if no such set can be found
+    Picks the candidate whose shortest literal is longest (most selective).
+    """
+    candidates = []
+    run = []
+
+    def end_run():
+        if run:
+            candidates.append(frozenset(["".join(run)]))
+            run.clear()
+
+    for op, av in items:
+        if op is sre_constants.LITERAL and av < 128:
+            run.append(chr(av).lower())
+            continue
+        if op is sre_constants.AT:
+            continue  # zero-width, does not split the literal run
+        end_run()
+        if op is sre_constants.SUBPATTERN:
+            found = _required_literals(av[-1])
+        elif op is sre_constants.BRANCH:
+            alternatives = [_required_literals(alternative) for alternative in av[1]]
+            found = None if None in alternatives else frozenset().union(*alternatives)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] > 0:
+            found = _required_literals(av[2])
+        else:
+            found = None
+        if found:
+            candidates.append(found)
+    end_run()
+
+    if not candidates:
+        return None
+    return max(candidates, key=lambda lits: (min(map(len, lits)), -len(lits)))
+
+
+def literal_anchors(pattern: str) -> Optional[FrozenSet[str]]:
+    """
+    Lowercase literals a case-insensitive match of pattern must contain one of
+    Only valid for ASCII text; returns None if there is no usable anchor.
+    """
+    try:
+        return _required_literals(sre_parse.parse(pattern, re.IGNORECASE))
+    except (re.error, RecursionError):
+        return None
+
+
+# Default regex flags for signatures. DOTALL lets '.' span newlines, so an
+# attack payload cannot slip past a signature by splitting it across lines.
+SIGNATURE_FLAGS = re.IGNORECASE | re.DOTALL
+
+# Compiled forms and prefilters per (pattern, flags), shared by every Signature
+# built from the same pattern: (compiled, ascii, first_chars, literal_anchors)
+_PATTERN_CACHE: Dict[Tuple[str, int], Tuple[re.Pattern, re.Pattern, Optional[FrozenSet[str]], Optional[FrozenSet[str]]]] = {}
+
+
 @dataclass
 class Signature:
     """WAF signature definition"""
@@ -39,14 +182,36 @@ class Signature:
     category: AttackCategory
     severity: Severity
     description: str
+    flags: int = SIGNATURE_FLAGS  # re flags; drop re.DOTALL for line-limited matching
     compiled_pattern: Optional[re.Pattern] = None
+    ascii_pattern: Optional[re.Pattern] = None  # same pattern with ASCII-only case folding
+    first_chars: Optional[FrozenSet[str]] = None  # prefilter, None = always scan
+    literal_anchors: Optional[FrozenSet[str]] = None  # prefilter, None = always scan
+    severity_rank: int = 0  # SEVERITY_RANK of severity, the sort key in scan_detailed
+    match_info: Optional[Dict[str, str]] = None  # scan_detailed fields shared by every match
 
     def __post_init__(self):
-        """Compile regex pattern for performance"""
-        try:
-            self.compiled_pattern = re.compile(self.pattern, re.IGNORECASE)
-        except re.error:
-            self.compiled_pattern = None
+        """
+        Compile regex pattern for performance
+        An invalid pattern raises re.error: a broken signature is a
+        configuration bug and must not silently disable detection.
+        """
+        key = (self.pattern, self.flags)
+        compiled = _PATTERN_CACHE.get(key)
+        if compiled is None:
+            compiled = _PATTERN_CACHE[key] = (
+                re.compile(self.pattern, self.flags),
+                re.compile(self.pattern, self.flags | re.ASCII),
+                first_chars(self.pattern),
+                literal_anchors(self.pattern),
+            )
+        self.compiled_pattern, self.ascii_pattern, self.first_chars, self.literal_anchors = compiled
+        self.severity_rank = SEVERITY_RANK[self.severity]
+        self.match_info = {
+            "category": self.category.value,
+            "severity": self.severity.value,
+            "description": self.description,
+        }
 
 
 # ============================================================================
@@ -54,8 +219,11 @@ class Signature:
 # ============================================================================
 
 SQL_INJECTION_SIGNATURES = [
+    # The gap after each keyword may not contain another occurrence of it, so a
+    # run of "union union ..." is scanned once instead of once per repeat
+    # (same matches as "union.+select" - the last union before select wins)
     Signature(
-        pattern=r"(\bunion\b.+\bselect\b|\bselect\b.+\bfrom\b)",
+        pattern=r"(\bunion\b(?:(?!\bunion\b).)+?\bselect\b|\bselect\b(?:(?!\bselect\b).)+?\bfrom\b)",
         category=AttackCategory.SQL_INJECTION,
         severity=Severity.CRITICAL,
         description="SQL UNION/SELECT injection attempt"
@@ -78,8 +246,13 @@ SQL_INJECTION_SIGNATURES = [
         severity=Severity.MEDIUM,
         description="SQL comment injection"
     ),
+    # Same keyword-gap rewrite as the UNION/SELECT signature above
     Signature(
-        pattern=r"\b(drop|delete|insert|update|alter|create|truncate)\b.+\b(table|database|index)\b",
+        pattern=(
+            r"\b(drop|delete|insert|update|alter|create|truncate)\b"
+            r"(?:(?!\b(?:drop|delete|insert|update|alter|create|truncate)\b).)+?"
+            r"\b(table|database|index)\b"
+        ),
         category=AttackCategory.SQL_INJECTION,
         severity=Severity.CRITICAL,
         description="SQL DDL/DML injection attempt"
@@ -170,8 +343,11 @@ COMMAND_INJECTION_SIGNATURES = [
         severity=Severity.CRITICAL,
         description="Command substitution injection"
     ),
+    # Equivalent to "(nc|netcat)\s+-.*\s+\d{1,5}" without the quadratic
+    # backtracking on long whitespace runs: a whitespace run is only tried
+    # from its first character and taken whole ((?=(\s+))\2 is atomic)
     Signature(
-        pattern=r"(nc|netcat)\s+-.*\s+\d{1,5}",
+        pattern=r"(nc|netcat)\s+-(?:(?!(?:nc|netcat)\s+-).)*?(?<!\s)(?=(\s+))\2\d{1,5}",
         category=AttackCategory.COMMAND_INJECTION,
         severity=Severity.CRITICAL,
         description="Netcat reverse shell attempt"
@@ -214,8 +390,9 @@ PATH_TRAVERSAL_SIGNATURES = [
 # ============================================================================
 
 XXE_SIGNATURES = [
+    # Stop at the next <!DOCTYPE so repeated declarations are not rescanned
     Signature(
-        pattern=r"<!DOCTYPE[^>]*\[.*<!ENTITY",
+        pattern=r"<!DOCTYPE(?:(?!<!DOCTYPE)[^>])*\[.*<!ENTITY",
         category=AttackCategory.XXE,
         severity=Severity.CRITICAL,
         description="XXE entity declaration"
@@ -283,6 +460,12 @@ class SignatureDatabase:
     def __init__(self):
         """Initialize signature database"""
         self.signatures: List[Signature] = []
+        self.by_category: Dict[AttackCategory, List[Signature]] = {
+            category: [] for category in AttackCategory
+        }
+        # Flattened signature lists per requested category tuple (scan)
+        self._category_views: Dict[Tuple[AttackCategory, ...], List[Signature]] = {}
+        self._scan_cache: "OrderedDict[Union[str, bytes], List[Tuple[Signature, re.Match]]]" = OrderedDict()
         self._load_default_signatures()
 
     def _load_default_signatures(self):
@@ -299,40 +482,133 @@ class SignatureDatabase:
         )
 
         for sig in all_signatures:
-            if sig.compiled_pattern:
-                self.signatures.append(sig)
-
-    def scan(self, text: str) -> List[Tuple[Signature, re.Match]]:
+            self._index_signature(sig)
+
+    def _index_signature(self, signature: Signature):
+        """Add a signature to the flat list and its category list"""
+        self.signatures.append(signature)
+        self.by_category[signature.category].append(signature)
+        self._category_views.clear()
+
+    def scan(
+        self,
+        text: Union[str, bytes],
+        max_length: Optional[int] = None,
+        categories: Optional[Iterable[AttackCategory]] = None
+    ) -> List[Tuple[Signature, re.Match]]:
         """
         Scan text against all signatures
 
         Args:
-            text: Text to scan
+            text: Text to scan (raw bytes such as a query string or header
+                value are treated as latin-1, like Starlette decodes them)
+            max_length: Only scan this many leading characters/bytes
+            categories: Only run signatures of these categories (default: all)
 
         Returns:
-            List of (signature, match) tuples
+            List of (signature, match) tuples. Results for short texts are
+            shared from a cache, so callers must not modify the list.
         """
-        matches = []
+        # Truncate once here so no signature walks past the limit
+        if max_length is not None and len(text) > max_length:
+            text = text[:max_length]
+
+        if categories is None:
+            signatures = self.signatures
+            key = text
+        else:
+            categories = tuple(categories)
+            signatures = self._category_views.get(categories)
+            if signatures is None:
+                signatures = self._category_views[categories] = [
+                    sig for category in categories for sig in self.by_category[category]
+                ]
+            key = (text, categories)
+
+        if len(text) > SCAN_CACHE_MAX_TEXT:
+            return self._scan_uncached(text, signatures)
+
+        cache = self._scan_cache
+        matches = cache.get(key)
+        if matches is not None:
+            cache.move_to_end(key)
+            return matches
+
+        matches = cache[key] = self._scan_uncached(text, signatures)
+        if len(cache) > SCAN_CACHE_SIZE:
+            cache.popitem(last=False)
+        return matches
 
-        for signature in self.signatures:
-            if signature.compiled_pattern:
-                match = signature.compiled_pattern.search(text)
-                if match:
-                    matches.append((signature, match))
+    def _scan_uncached(
+        self, text: Union[str, bytes], signatures: Optional[List[Signature]] = None
+    ) -> List[Tuple[Signature, re.Match]]:
+        """Scan text against signatures, all of them by default (see scan)"""
+        if signatures is None:
+            signatures = self.signatures
+        matches = []
+        is_bytes = isinstance(text, bytes)
+
+        # Plain ASCII text matches the same under re.ASCII, which skips
+        # Unicode case folding. Non-ASCII text, and the \x1c-\x1f separators
+        # only Unicode \s accepts, need the Unicode-mode patterns.
+        ascii_only = text.isascii() and (
+            _UNICODE_ONLY_SPACE_BYTES if is_bytes else _UNICODE_ONLY_SPACE
+        ).search(text) is None
+
+        if is_bytes:
+            text = text.decode("latin-1")
+
+        # Prefilters: a signature can only match if the text contains one of
+        # the characters its pattern can start with, and one of its literal
+        # anchors. Non-ASCII text is always fully scanned because IGNORECASE
+        # folds some Unicode letters onto ASCII.
+        if text.isascii():
+            text_chars = set(text)
+            text_lower = text.lower()
+        else:
+            text_chars = text_lower = None
+
+        for signature in signatures:
+            if (
+                text_chars is not None
+                and signature.first_chars is not None
+                and signature.first_chars.isdisjoint(text_chars)
+            ):
+                continue
+            if text_lower is not None and signature.literal_anchors is not None:
+                for anchor in signature.literal_anchors:
+                    if anchor in text_lower:
+                        break
+                else:
+                    continue
+            pattern = signature.ascii_pattern if ascii_only else signature.compiled_pattern
+            match = pattern.search(text)
+            if match:
+                matches.append((signature, match))
 
         return matches
 
-    def scan_detailed(self, text: str) -> Dict[str, any]:
+    def scan_detailed(
+        self,
+        text: Union[str, bytes],
+        sort: bool = False,
+        max_length: Optional[int] = None,
+        categories: Optional[Iterable[AttackCategory]] = None
+    ) -> Dict[str, any]:
         """
         Detailed scan with categorized results
 
         Args:
             text: Text to scan
+            sort: Order all matches by severity. Otherwise only the most
+                severe match is moved to the front; the rest keep scan order.
+            max_length: Only scan this many leading characters/bytes
+            categories: Only run signatures of these categories (default: all)
 
         Returns:
             Dictionary with scan results
         """
-        matches = self.scan(text)
+        matches = self.scan(text, max_length, categories)
 
         if not matches:
             return {
@@ -342,39 +618,39 @@ class SignatureDatabase:
                 "categories": []
             }
 
-        # Sort by severity
-        severity_order = {
-            Severity.CRITICAL: 4,
-            Severity.HIGH: 3,
-            Severity.MEDIUM: 2,
-            Severity.LOW: 1
-        }
-
-        sorted_matches = sorted(
-            matches,
-            key=lambda x: severity_order[x[0].severity],
-            reverse=True
-        )
+        if sort:
+            matches = sorted(matches, key=lambda x: x[0].severity_rank, reverse=True)
+
+        # Single pass: build the match dicts, collect categories and track
+        # the first match of the highest severity
+        result_matches = []
+        categories = set()
+        top = 0
+        top_rank = 0
+        for i, (sig, match) in enumerate(matches):
+            info = sig.match_info
+            categories.add(info["category"])
+            if sig.severity_rank > top_rank:
+                top, top_rank = i, sig.severity_rank
+            result_matches.append({
+                **info,
+                "matched_text": match.group(0)[:100]  # Truncate for safety
+            })
+
+        if top:
+            result_matches.insert(0, result_matches.pop(top))
 
         return {
             "threat_detected": True,
-            "matches": [
-                {
-                    "category": sig.category.value,
-                    "severity": sig.severity.value,
-                    "description": sig.description,
-                    "matched_text": match.group(0)[:100]  # Truncate for safety
-                }
-                for sig, match in sorted_matches
-            ],
-            "highest_severity": sorted_matches[0][0].severity.value,
-            "categories": list(set(sig.category.value for sig, _ in sorted_matches))
+            "matches": result_matches,
+            "highest_severity": result_matches[0]["severity"],
+            "categories": list(categories)
         }
 
     def add_custom_signature(self, signature: Signature):
         """Add custom signature to database"""
-        if signature.compiled_pattern:
-            self.signatures.append(signature)
+        self._index_signature(signature)
+        self._scan_cache.clear()
 
     def get_stats(self) -> Dict[str, int]:
         """Get signature database statistics"""
@@ -383,10 +659,7 @@ class SignatureDatabase:
         }
 
         for category in AttackCategory:
-            stats[category.value] = sum(
-                1 for sig in self.signatures
-                if sig.category == category
-            )
+            stats[category.value] = len(self.by_category[category])
 
         return stats
 
@@ -0,0 +1,79 @@
+"""Pytest configuration and fixtures for API Gateway tests"""
+
+import time
+from typing import Callable, Generator, Iterable, Tuple
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app import middleware
+from app.main import app
+from app.waf_config import load_waf_config
+
+BROWSER_UA = "Mozilla/5.0 (X11; Linux x86_64) Gateway Tests"
+
+
+@pytest.fixture(scope="function")
+def client() -> Generator[TestClient, None, None]:
+    """Test client with a freshly built middleware stack (empty rate-limit buckets)."""
+    load_waf_config.cache_clear()
+    app.middleware_stack = None  # rebuilt by Starlette on the next request
+
+    with TestClient(app) as test_client:
+        test_client.headers["User-Agent"] = BROWSER_UA
+        yield test_client
+
+
+@pytest.fixture(scope="function")
+def raw_get(client) -> Callable[..., httpx.Response]:
+    """
+    Send a GET straight through ASGI, bypassing httpx's URL and header encoding.
+    The query string and header values reach the gateway byte for byte.
+    """
+    def send_request(
+        path: str,
+        query_string: bytes = b"",
+        headers: Iterable[Tuple[bytes, bytes]] = (),
+    ) -> httpx.Response:
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": query_string,
+            "headers": [(b"host", b"testserver"), (b"user-agent", BROWSER_UA.encode()), *headers],
+            "client": ("testclient", 50000),
+            "server": ("testserver", 80),
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        client.portal.call(app, scope, receive, send)
+        start = messages[0]
+        return httpx.Response(
+            start["status"],
+            headers=start.get("headers", []),
+            content=b"".join(m.get("body", b"") for m in messages[1:]),
+        )
+
+    return send_request
+
+
+@pytest.fixture(scope="function")
+def clock(monkeypatch) -> list:
+    """Freeze the monotonic clock the rate-limit buckets read (advance clock[0] in ms)."""
+    now_ms = [time.monotonic_ns() // 1_000_000]
+    monkeypatch.setattr(
+        middleware.time, "monotonic_ns", lambda: now_ms[0] * 1_000_000
+    )
+    return now_ms
@@ -0,0 +1,273 @@
+"""Integration tests for the gateway middleware stack (WAF and rate limiting)"""
+
+from fastapi import status
+
+
+def ip_headers(ip: str, **headers) -> dict:
+    """
+    Headers for a request from ip (resolved via X-Forwarded-For)
+    Tests use TEST-NET-3 addresses: private ones match the SSRF signatures.
+    """
+    return {"X-Forwarded-For": ip, **headers}
+
+
+class TestWAFChecks:
+    """Tests for the per-request checks in GatewayMiddleware"""
+
+    def test_clean_request_passes(self, client):
+        """A clean request reaches the app and gets the gateway headers"""
+        response = client.get("/", headers=ip_headers("203.0.113.1"))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["x-waf-status"] == "passed"
+        assert response.headers["x-ratelimit-limit"] == "60"
+        assert response.headers["x-ratelimit-remaining"] == "9"
+        assert response.headers["x-content-type-options"] == "nosniff"
+        assert response.headers["x-response-time"].endswith("s")
+
+    def test_oversized_request_blocked(self, client):
+        """Content-Length above the limit is rejected before any other check"""
+        response = client.get(
+            "/", headers=ip_headers("203.0.113.2", **{"Content-Length": str(10**9)})
+        )
+
+        assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        assert response.json() == {
+            "error": "Request Entity Too Large",
+            "message": "Request body exceeds maximum size",
+            "blocked_by": "WAF",
+        }
+
+    def test_missing_user_agent_blocked(self, client):
+        """Requests without a User-Agent header are rejected"""
+        del client.headers["User-Agent"]
+        response = client.get("/", headers=ip_headers("203.0.113.3"))
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert response.json() == {
+            "error": "Forbidden",
+            "message": "User-Agent header required",
+            "blocked_by": "WAF",
+        }
+
+    def test_malicious_user_agent_blocked(self, client):
+        """Known attack tool User-Agents are rejected"""
+        response = client.get(
+            "/", headers=ip_headers("203.0.113.4", **{"User-Agent": "sqlmap/1.7"})
+        )
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert response.json() == {
+            "error": "Forbidden",
+            "message": "Malicious User-Agent detected",
+            "blocked_by": "WAF",
+        }
+
+    def test_suspicious_bot_blocked(self, client):
+        """Bot User-Agents are rejected unless they are an allowed bot"""
+        response = client.get(
+            "/", headers=ip_headers("203.0.113.5", **{"User-Agent": "mybot/1.0"})
+        )
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert response.json() == {
+            "error": "Forbidden",
+            "message": "Automated bot traffic not allowed",
+            "blocked_by": "WAF",
+        }
+
+    def test_allowed_bot_passes(self, client):
+        """Allowed bots (search engines) are not treated as suspicious"""
+        response = client.get(
+            "/", headers=ip_headers("203.0.113.6", **{"User-Agent": "Googlebot/2.1"})
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_oversized_url_blocked(self, client):
+        """URLs longer than max_url_length are rejected"""
+        response = client.get("/" + "a" * 3000, headers=ip_headers("203.0.113.7"))
+
+        assert response.status_code == status.HTTP_414_REQUEST_URI_TOO_LONG
+        assert response.json() == {
+            "error": "URI Too Long",
+            "message": "URL exceeds maximum length",
+            "blocked_by": "WAF",
+        }
+
+    def test_attack_signature_in_query_blocked(self, raw_get):
+        """The raw query string is scanned for attack signatures"""
+        response = raw_get(
+            "/",
+            query_string=b"file=../../etc/passwd",
+            headers=[(b"x-forwarded-for", b"203.0.113.8")],
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == {
+            "error": "Bad Request",
+            "message": "Attack pattern detected: path_traversal",
+            "blocked_by": "WAF",
+            "severity": "critical",
+        }
+
+    def test_attack_signature_in_header_blocked(self, client):
+        """Header values are scanned for attack signatures"""
+        response = client.get(
+            "/", headers=ip_headers("203.0.113.9", **{"X-Custom": "../../etc/passwd"})
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["message"] == "Attack pattern detected: path_traversal"
+
+    def test_raw_header_bytes_scanned_as_latin1(self, raw_get):
+        """Non-ASCII header bytes are scanned as latin-1 (\\xa0 counts as whitespace)"""
+        response = raw_get(
+            "/",
+            headers=[
+                (b"x-forwarded-for", b"203.0.113.10"),
+                (b"x-custom", b"x\xa0union\xa0select\xa0password"),
+            ],
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == {
+            "error": "Bad Request",
+            "message": "Attack pattern detected: sql_injection",
+            "blocked_by": "WAF",
+            "severity": "critical",
+        }
+
+    def test_raw_header_bytes_with_unicode_only_space_scanned(self, raw_get):
+        """\\x1c-\\x1f separators still match \\s, as they do for str input"""
+        response = raw_get(
+            "/",
+            headers=[(b"x-forwarded-for", b"203.0.113.11"), (b"x-custom", b"' or\x1c1=1")],
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["message"] == "Attack pattern detected: sql_injection"
+
+    def test_clean_non_ascii_header_passes(self, raw_get):
+        """Non-ASCII header bytes without an attack pattern are let through"""
+        response = raw_get(
+            "/",
+            headers=[(b"x-forwarded-for", b"203.0.113.12"), (b"x-custom", b"caf\xe9")],
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["x-waf-status"] == "passed"
+
+    def test_invalid_method_blocked(self, client):
+        """Methods outside ALLOWED_METHODS are rejected"""
+        response = client.request("TRACE", "/", headers=ip_headers("203.0.113.13"))
+
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+        assert response.json() == {
+            "error": "Method Not Allowed",
+            "message": "HTTP method TRACE is not allowed",
+        }
+
+
+class TestRateLimiting:
+    """Tests for the per-IP and per-endpoint token buckets"""
+
+    def test_ip_rate_limit(self, client, clock):
+        """The burst is served, then requests get 429 until a token refills"""
+        headers = ip_headers("203.0.113.17")
+        codes = [client.get("/", headers=headers).status_code for _ in range(11)]
+
+        assert codes == [status.HTTP_200_OK] * 10 + [status.HTTP_429_TOO_MANY_REQUESTS]
+        response = client.get("/", headers=headers)
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert response.headers["retry-after"] == "60"
+        assert response.json() == {
+            "error": "Rate Limit Exceeded",
+            "message": "Too many requests. Limit: 60 requests per minute.",
+            "retry_after": 60,
+        }
+
+        # 60 req/min refills one token per second
+        clock[0] += 1000
+        response = client.get("/", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["x-ratelimit-remaining"] == "0"
+        assert client.get("/", headers=headers).status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+    def test_ip_rate_limit_is_per_ip(self, client, clock):
+        """One IP exhausting its bucket does not limit another"""
+        for _ in range(11):
+            client.get("/", headers=ip_headers("203.0.113.18"))
+
+        response = client.get("/", headers=ip_headers("203.0.113.19"))
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_endpoint_rate_limit(self, client, clock):
+        """Honeypot paths allow a burst of 2, then 429 until refilled"""
+        headers = ip_headers("203.0.113.33")
+        codes = [client.get("/admin", headers=headers).status_code for _ in range(3)]
+
+        assert codes == [
+            status.HTTP_200_OK,
+            status.HTTP_200_OK,
+            status.HTTP_429_TOO_MANY_REQUESTS,
+        ]
+        response = client.get("/admin", headers=headers)
+        assert response.headers["retry-after"] == "60"
+        assert response.json() == {
+            "error": "Rate Limit Exceeded",
+            "message": "Too many requests to this endpoint. Limit: 5 req/min",
+            "endpoint": "/admin",
+            "retry_after": 60,
+        }
+
+        # 5 req/min refills one token every 12 seconds
+        clock[0] += 6_000
+        assert client.get("/admin", headers=headers).status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        clock[0] += 6_000
+        assert client.get("/admin", headers=headers).status_code == status.HTTP_200_OK
+        assert client.get("/admin", headers=headers).status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+    def test_endpoint_rate_limit_refills_to_burst_only(self, client, clock):
+        """A long idle period refills the endpoint bucket up to its burst size"""
+        headers = ip_headers("203.0.113.34")
+        for _ in range(3):
+            client.get("/admin", headers=headers)
+
+        clock[0] += 10 * 60_000
+        codes = [client.get("/admin", headers=headers).status_code for _ in range(3)]
+        assert codes == [
+            status.HTTP_200_OK,
+            status.HTTP_200_OK,
+            status.HTTP_429_TOO_MANY_REQUESTS,
+        ]
+
+    def test_endpoint_rate_limit_does_not_apply_elsewhere(self, client, clock):
+        """Paths without an endpoint limit only use the per-IP bucket"""
+        headers = ip_headers("203.0.113.35")
+        for _ in range(3):
+            client.get("/admin", headers=headers)
+
+        assert client.get("/", headers=headers).status_code == status.HTTP_200_OK
+
+
+class TestInternalPaths:
+    """Tests for the /health and /metrics skips"""
+
+    def test_health_skips_waf_and_rate_limit(self, client):
+        """/health is neither rate limited nor checked by the WAF"""
+        headers = ip_headers("203.0.113.49", **{"User-Agent": "sqlmap/1.7"})
+        responses = [client.get("/health", headers=headers) for _ in range(15)]
+
+        assert all(r.status_code == status.HTTP_200_OK for r in responses)
+        assert "x-ratelimit-limit" not in responses[-1].headers
+        assert "x-waf-status" not in responses[-1].headers
+
+    def test_metrics_skips_waf_and_rate_limit(self, client):
+        """/metrics stays scrapeable without a User-Agent or rate limit"""
+        del client.headers["User-Agent"]
+        responses = [client.get("/metrics", headers=ip_headers("203.0.113.50")) for _ in range(15)]
+
+        assert all(r.status_code == status.HTTP_200_OK for r in responses)
+        assert responses[-1].headers["content-type"].startswith("text/plain")
+        assert "x-ratelimit-limit" not in responses[-1].headers
@@ -18,6 +18,8 @@ class Settings(BaseSettings):
     REDIS_HOST: str = "redis"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
+    REDIS_MAX_CONNECTIONS: int = 32
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # seconds idle before a ping on checkout
     
     # Rate Limiting
     ENABLE_RATE_LIMITING: bool = True
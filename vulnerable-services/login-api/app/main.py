@@ -3,19 +3,28 @@ DevSecOps Hacking Lab - Authentication Service
 Secure authentication flow with HTTPS, MFA, and token-based sessions.
 """
 
+import asyncio
+import atexit
+import contextlib
+import logging
+import os
+import sys
 from datetime import datetime
-from typing import Optional
+from typing import BinaryIO, Optional
 
+import orjson
 import redis.asyncio as redis_async
 import structlog
 from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request, status
-from fastapi.responses import Response
+from fastapi.responses import ORJSONResponse, Response
+from fastapi.utils import is_body_allowed_for_status_code
 from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from prometheus_fastapi_instrumentator import Instrumentator
 from redis.asyncio import Redis
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
+from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from app.config import settings
 from app.middleware import setup_middleware
@@ -43,13 +52,13 @@ from app.security import (
     create_mfa_challenge,
     current_mfa_code,
     delete_mfa_challenge,
+    fetch_stats_bundle,
     generate_token_bundle,
-    get_failed_attempts,
     get_mfa_challenge,
-    get_security_stats,
     increment_mfa_attempts,
     is_ip_banned,
-    record_failed_attempt,
+    record_failed_attempt_and_check_ban,
+    record_ip_ban,
     revoke_all_refresh_tokens,
     revoke_refresh_token,
     unban_ip,
@@ -58,21 +67,62 @@ from app.security import (
     verify_refresh_token,
 )
 
+LOG_FLUSH_INTERVAL = 0.25  # seconds
+
+
+class BufferedLogStream:
+    """
+    Log output that is only flushed on demand
+    BytesLogger flushes after every event, which means one write() syscall
+    per line. Here flush() is a no-op: lines collect in the stream's own
+    buffer and flush_now() writes them out (periodically, at shutdown and
+    at exit) unless the buffer fills first.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self.write = stream.write
+
+    def flush(self) -> None:
+        pass
+
+    def flush_now(self) -> None:
+        self._stream.flush()
+
+
+log_stream = BufferedLogStream(sys.stdout.buffer)
+
+
+@atexit.register
+def _flush_logs_at_exit() -> None:
+    # stdout may already be closed (or swapped back by a test runner)
+    with contextlib.suppress(OSError, ValueError):
+        log_stream.flush_now()
+
+
+async def flush_logs_periodically() -> None:
+    """Write out buffered log lines every LOG_FLUSH_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(LOG_FLUSH_INTERVAL)
+        log_stream.flush_now()
+
+
 # Configure structured logging
+# orjson renders each event straight to bytes, written to stdout without
+# going through the stdlib logging module. Events are logged with keyword
+# fields only (no positional args, exc_info or stack_info), so the chain
+# carries just the processors every event needs.
 structlog.configure(
     processors=[
-        structlog.stdlib.filter_by_level,
-        structlog.stdlib.add_logger_name,
-        structlog.stdlib.add_log_level,
-        structlog.stdlib.PositionalArgumentsFormatter(),
-        structlog.processors.TimeStamper(fmt="iso"),
-        structlog.processors.StackInfoRenderer(),
-        structlog.processors.format_exc_info,
-        structlog.processors.JSONRenderer(),
+        structlog.processors.add_log_level,
+        structlog.processors.TimeStamper(fmt="iso", utc=True),
+        structlog.processors.JSONRenderer(serializer=orjson.dumps),
     ],
-    wrapper_class=structlog.stdlib.BoundLogger,
+    wrapper_class=structlog.make_filtering_bound_logger(
+        getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO)
+    ),
     context_class=dict,
-    logger_factory=structlog.stdlib.LoggerFactory(),
+    logger_factory=structlog.BytesLoggerFactory(log_stream),
     cache_logger_on_first_use=True,
 )
 
@@ -87,8 +137,7 @@ def custom_rate_limit_key(request: Request) -> str:
     # Check for X-Direct-Access header (Security OFF mode)
     if request.headers.get("X-Direct-Access") == "true":
         # Return unique key for each request - effectively no rate limiting
-        import uuid
-        unique_key = f"direct-access-{uuid.uuid4()}"
+        unique_key = "direct-access-" + os.urandom(8).hex()
         logger.info(
             "rate_limit_bypassed",
             path=request.url.path,
@@ -104,6 +153,10 @@ def custom_rate_limit_key(request: Request) -> str:
 # Initialize rate limiter with custom key function
 limiter = Limiter(key_func=custom_rate_limit_key)
 
+# Shared limit for the login/MFA/refresh endpoints. A static string is parsed
+# once by slowapi when the decorator is applied, not per request.
+AUTH_RATE_LIMIT = f"{settings.RATE_LIMIT_REQUESTS}/{settings.RATE_LIMIT_WINDOW}seconds"
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.SERVICE_NAME,
@@ -111,6 +164,7 @@ app = FastAPI(
     version="2.0.0",
     docs_url="/docs" if settings.ENVIRONMENT == "development" else None,
     redoc_url="/redoc" if settings.ENVIRONMENT == "development" else None,
+    default_response_class=ORJSONResponse,
 )
 
 # Prometheus instrumentation
@@ -142,21 +196,29 @@ async def get_redis(request: Request) -> Redis:
     return redis
 
 
-def build_token_response(bundle, message: str) -> TokenResponse:
+def build_token_response(bundle, message: str) -> ORJSONResponse:
+    """
+    Token response for the login/MFA/refresh endpoints
+    Every field comes from our own token bundle, so the body is rendered
+    directly instead of being validated again against TokenResponse
+    (still the documented response_model).
+    """
+    now = datetime.utcnow()
     access_expires_in = max(
-        int((bundle.access_expires_at - datetime.utcnow()).total_seconds()), 0
+        int((bundle.access_expires_at - now).total_seconds()), 0
     )
     refresh_expires_in = max(
-        int((bundle.refresh_expires_at - datetime.utcnow()).total_seconds()), 0
-    )
-    return TokenResponse(
-        success=True,
-        message=message,
-        access_token=bundle.access_token,
-        refresh_token=bundle.refresh_token,
-        expires_in=access_expires_in,
-        refresh_expires_in=refresh_expires_in,
+        int((bundle.refresh_expires_at - now).total_seconds()), 0
     )
+    return ORJSONResponse({
+        "success": True,
+        "message": message,
+        "token_type": "bearer",
+        "access_token": bundle.access_token,
+        "refresh_token": bundle.refresh_token,
+        "expires_in": access_expires_in,
+        "refresh_expires_in": refresh_expires_in,
+    })
 
 
 async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
@@ -170,12 +232,25 @@ async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
 app.add_exception_handler(RateLimitExceeded, rate_limit_handler)
 
 
+async def http_exception_handler(request: Request, exc: StarletteHTTPException):
+    """FastAPI's default HTTPException handler, rendered with orjson."""
+    headers = getattr(exc, "headers", None)
+    if not is_body_allowed_for_status_code(exc.status_code):
+        return Response(status_code=exc.status_code, headers=headers)
+    return ORJSONResponse(
+        {"detail": exc.detail}, status_code=exc.status_code, headers=headers
+    )
+
+
+app.add_exception_handler(StarletteHTTPException, http_exception_handler)
+
+
 @auth_router.post(
     "/login",
     response_model=LoginResponse,
     summary="Initiate authentication (password step)",
 )
-@limiter.limit(f"{settings.RATE_LIMIT_REQUESTS}/{settings.RATE_LIMIT_WINDOW}seconds")
+@limiter.limit(AUTH_RATE_LIMIT)
 async def login(
     request: Request,
     login_data: LoginRequest,
@@ -193,7 +268,6 @@ async def login(
         "login_attempt",
         username=login_data.username,
         client_ip=client_ip,
-        timestamp=datetime.utcnow().isoformat(),
     )
 
     if settings.ENABLE_IP_BANNING and await is_ip_banned(redis, client_ip):
@@ -209,7 +283,9 @@ async def login(
         )
 
     if not verify_login(login_data.username, login_data.password):
-        failed_count = await record_failed_attempt(redis, client_ip, login_data.username)
+        failed_count, banned = await record_failed_attempt_and_check_ban(
+            redis, client_ip, login_data.username
+        )
         observe_login_failure("invalid_credentials")
         observe_login_stage("password_failure")
         logger.warning(
@@ -219,8 +295,7 @@ async def login(
             failed_attempts=failed_count,
         )
 
-        if settings.ENABLE_IP_BANNING and failed_count >= settings.BAN_THRESHOLD:
-            await ban_ip(redis, client_ip)
+        if banned:
             observe_login_blocked("failed_attempt_threshold")
             logger.warning(
                 "ip_banned",
@@ -276,7 +351,7 @@ async def login(
     response_model=TokenResponse,
     summary="Complete authentication with MFA code",
 )
-@limiter.limit(f"{settings.RATE_LIMIT_REQUESTS}/{settings.RATE_LIMIT_WINDOW}seconds")
+@limiter.limit(AUTH_RATE_LIMIT)
 async def verify_mfa(
     request: Request,
     request_payload: MfaVerifyRequest,
@@ -301,10 +376,16 @@ async def verify_mfa(
         observe_login_stage("mfa_failure")
 
         if attempts >= settings.MFA_MAX_ATTEMPTS:
-            await delete_mfa_challenge(redis, request_payload.challenge_id)
+            # Drop the challenge and ban the IP in one round-trip
+            ban_client = bool(client_ip and settings.ENABLE_IP_BANNING)
+            async with redis.pipeline(transaction=False) as pipe:
+                await delete_mfa_challenge(redis, request_payload.challenge_id, pipe=pipe)
+                if ban_client:
+                    await ban_ip(redis, client_ip, pipe=pipe)
+                await pipe.execute()
+            if ban_client:
+                record_ip_ban(client_ip)
             observe_login_blocked("mfa_failure_threshold")
-            if client_ip and settings.ENABLE_IP_BANNING:
-                await ban_ip(redis, client_ip)
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Too many invalid MFA attempts.",
@@ -334,7 +415,7 @@ async def verify_mfa(
     response_model=TokenResponse,
     summary="Obtain a new access token using a refresh token",
 )
-@limiter.limit(f"{settings.RATE_LIMIT_REQUESTS}/{settings.RATE_LIMIT_WINDOW}seconds")
+@limiter.limit(AUTH_RATE_LIMIT)
 async def refresh_token(
     request: Request,
     request_payload: RefreshRequest,
@@ -462,9 +543,7 @@ async def get_stats(request: Request, redis: Redis = Depends(get_redis)):
     Note: This endpoint should be protected in production!
     """
     client_ip = get_remote_address(request)
-    failed_attempts = await get_failed_attempts(redis, client_ip)
-    banned = await is_ip_banned(redis, client_ip)
-    overall = await get_security_stats(redis)
+    failed_attempts, banned, overall = await fetch_stats_bundle(redis, client_ip)
 
     return {
         "client_ip": client_ip,
@@ -543,14 +622,20 @@ async def startup_event():
         rate_limiting=settings.ENABLE_RATE_LIMITING,
         ip_banning=settings.ENABLE_IP_BANNING,
         mfa_enabled=settings.MFA_ENABLED,
+        event_loop=type(asyncio.get_running_loop()).__name__,
     )
 
-    redis_client = redis_async.Redis(
+    # Bounded pool: requests wait for a free connection instead of opening
+    # an unlimited number of sockets under load
+    redis_pool = redis_async.BlockingConnectionPool(
         host=settings.REDIS_HOST,
         port=settings.REDIS_PORT,
         db=settings.REDIS_DB,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
         decode_responses=True,
     )
+    redis_client = redis_async.Redis(connection_pool=redis_pool)
     try:
         await redis_client.ping()
         logger.info(
@@ -561,7 +646,9 @@ async def startup_event():
     except Exception as exc:  # pragma: no cover - connection failure logging
         logger.error("redis_connection_failed", error=str(exc))
 
+    app.state.redis_pool = redis_pool
     app.state.redis = redis_client
+    app.state.log_flusher = asyncio.create_task(flush_logs_periodically())
     instrumentator.expose(app, include_in_schema=False)
 
 
@@ -569,7 +656,13 @@ async def startup_event():
 async def shutdown_event():
     """Shutdown event handler."""
     logger.info("service_shutting_down", service=settings.SERVICE_NAME)
+    log_flusher: Optional[asyncio.Task] = getattr(app.state, "log_flusher", None)
+    if log_flusher:
+        log_flusher.cancel()
+    log_stream.flush_now()
     redis_client: Optional[Redis] = getattr(app.state, "redis", None)
     if redis_client:
         await redis_client.close()
-        await redis_client.connection_pool.disconnect()
+    redis_pool = getattr(app.state, "redis_pool", None)
+    if redis_pool:
+        await redis_pool.disconnect()
@@ -2,6 +2,8 @@
 Prometheus metrics helpers for login API
 """
 
+from typing import Tuple
+
 from prometheus_client import Counter
 
 # Core login metrics
@@ -48,44 +50,97 @@ JWT_REFRESH_TOTAL = Counter(
 )
 
 
+class _LabelCache(dict):
+    """Child metrics of a single-label counter, created on first use of a label value."""
+
+    def __init__(self, counter: Counter, known_values: Tuple[str, ...] = ()):
+        super().__init__()
+        self._counter = counter
+        # Register the label values the service emits up front, so their
+        # series are exported (at 0) from startup
+        for value in known_values:
+            self[value]
+
+    def __missing__(self, value: str):
+        child = self[value] = self._counter.labels(value)
+        return child
+
+
+# Resolved children, so each observation skips the labels() lookup and its lock
+_LOGIN_OUTCOMES = _LabelCache(LOGIN_ATTEMPTS_TOTAL, ("success", "failure", "blocked"))
+_FAILED_REASONS = _LabelCache(
+    FAILED_LOGIN_TOTAL,
+    (
+        "invalid_credentials",
+        "mfa_invalid_code",
+        "mfa_challenge_missing",
+        "rate_limited",
+        "ip_banned",
+        "failed_attempt_threshold",
+        "mfa_failure_threshold",
+    ),
+)
+_IP_BAN_REASONS = _LabelCache(IP_BANS_TOTAL, ("policy_violation",))
+_RATE_LIMIT_ENDPOINTS = _LabelCache(
+    RATE_LIMIT_BLOCKS_TOTAL,
+    ("/auth/login", "/auth/mfa/verify", "/auth/token/refresh"),
+)
+_LOGIN_STAGES = _LabelCache(
+    LOGIN_STAGE_TOTAL,
+    (
+        "password_attempt",
+        "password_success",
+        "password_failure",
+        "mfa_success",
+        "mfa_failure",
+        "token_issued",
+        "token_refreshed",
+        "rate_limited",
+    ),
+)
+_MFA_RESULTS = _LabelCache(MFA_ATTEMPTS_TOTAL, ("success", "failure", "missing"))
+_REFRESH_STATUSES = _LabelCache(
+    JWT_REFRESH_TOTAL, ("success", "denied", "revoked_all", "revoked_single")
+)
+
+
 def observe_login_success() -> None:
     """Increment counters when a login succeeds."""
-    LOGIN_ATTEMPTS_TOTAL.labels(outcome="success").inc()
+    _LOGIN_OUTCOMES["success"].inc()
 
 
 def observe_login_failure(reason: str) -> None:
     """Increment counters when a login fails."""
-    LOGIN_ATTEMPTS_TOTAL.labels(outcome="failure").inc()
-    FAILED_LOGIN_TOTAL.labels(reason=reason).inc()
+    _LOGIN_OUTCOMES["failure"].inc()
+    _FAILED_REASONS[reason].inc()
 
 
 def observe_login_blocked(reason: str) -> None:
     """Increment counters when a login attempt is blocked before authentication."""
-    LOGIN_ATTEMPTS_TOTAL.labels(outcome="blocked").inc()
-    FAILED_LOGIN_TOTAL.labels(reason=reason).inc()
+    _LOGIN_OUTCOMES["blocked"].inc()
+    _FAILED_REASONS[reason].inc()
 
 
 def observe_ip_ban(reason: str) -> None:
     """Increment counters when an IP is banned."""
-    IP_BANS_TOTAL.labels(reason=reason).inc()
+    _IP_BAN_REASONS[reason].inc()
 
 
 def observe_rate_limit(endpoint: str) -> None:
     """Increment counters when the rate limiter blocks a request."""
-    RATE_LIMIT_BLOCKS_TOTAL.labels(endpoint=endpoint).inc()
+    _RATE_LIMIT_ENDPOINTS[endpoint].inc()
 
 
 def observe_login_stage(stage: str) -> None:
     """Observe a particular stage in the authentication flow."""
-    LOGIN_STAGE_TOTAL.labels(stage=stage).inc()
+    _LOGIN_STAGES[stage].inc()
 
 
 def observe_mfa_attempt(result: str) -> None:
     """Observe MFA verification attempts."""
-    MFA_ATTEMPTS_TOTAL.labels(result=result).inc()
+    _MFA_RESULTS[result].inc()
 
 
 def observe_refresh(status: str) -> None:
     """Observe refresh token operations."""
-    JWT_REFRESH_TOTAL.labels(status=status).inc()
-
+    _REFRESH_STATUSES[status].inc()
@@ -2,15 +2,19 @@
 Security functions and defense mechanisms
 """
 
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 import secrets
+import time
 import uuid
 import structlog
 import pyotp
 from jose import jwt
 from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.commands.core import AsyncScript
 
 from app.config import settings
 from app.metrics import observe_ip_ban
@@ -21,6 +25,29 @@ logger = structlog.get_logger()
 failed_attempts: Dict[str, list] = {}
 banned_ips: Dict[str, datetime] = {}
 
+# Recently confirmed bans, kept in-process so a banned IP hammering the login
+# endpoint is rejected without a Redis round-trip per request. Only positive
+# results are cached: a ban issued by another worker is seen on the next
+# lookup, and a cached ban outlives an unban elsewhere by at most the TTL.
+BAN_CACHE_TTL = 5.0  # seconds
+BAN_CACHE_SIZE = 4096
+_ban_cache: "OrderedDict[str, float]" = OrderedDict()  # ip -> time.monotonic() expiry
+
+
+def _cache_ban(ip: str):
+    """Remember a confirmed ban for BAN_CACHE_TTL seconds"""
+    now = time.monotonic()
+    # Re-insert at the end: with one TTL for all entries, insertion order is
+    # expiry order, so the oldest entries are the first to expire
+    _ban_cache.pop(ip, None)
+    if len(_ban_cache) >= BAN_CACHE_SIZE:
+        while _ban_cache and next(iter(_ban_cache.values())) <= now:
+            _ban_cache.popitem(last=False)
+        if len(_ban_cache) >= BAN_CACHE_SIZE:
+            _ban_cache.popitem(last=False)
+    _ban_cache[ip] = now + BAN_CACHE_TTL
+
+
 # Mock user database (intentionally simple for educational purposes)
 MOCK_USERS = {
     "admin": "admin123",
@@ -54,26 +81,67 @@ async def record_failed_attempt(redis: Redis, ip: str, username: str) -> int:
     Record a failed login attempt from an IP address
     Returns the total number of failed attempts
     """
-    import uuid
     key = f"failed_attempts:{ip}"
     now = int(datetime.utcnow().timestamp())
     
     # Use unique member with UUID to allow multiple attempts in same second
     member = f"{username}:{now}:{uuid.uuid4().hex[:8]}"
-    
-    # Add new attempt with current timestamp as score
-    await redis.zadd(key, {member: now})
-    
-    # Clean old attempts (older than BAN_DURATION)
     cutoff = now - settings.BAN_DURATION
-    await redis.zremrangebyscore(key, 0, cutoff)
     
-    # Set expiry on the key
-    await redis.expire(key, settings.BAN_DURATION)
+    # One round-trip: add the attempt (timestamp as score), drop attempts
+    # older than BAN_DURATION, refresh the key expiry and read the count
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zadd(key, {member: now})
+        pipe.zremrangebyscore(key, 0, cutoff)
+        pipe.expire(key, settings.BAN_DURATION)
+        pipe.zcard(key)
+        results = await pipe.execute()
     
     # Return current count
-    count = await redis.zcard(key)
-    return count
+    return results[-1]
+
+
+# Same steps as record_failed_attempt, plus the ban once the count reaches
+# the threshold (ARGV[5], 0 = never ban), atomically in one round-trip.
+# Returns {count, banned}.
+_RECORD_FAILED_ATTEMPT_LUA = b"""
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+local count = redis.call('ZCARD', KEYS[1])
+local threshold = tonumber(ARGV[5])
+if threshold > 0 and count >= threshold then
+    redis.call('SETEX', KEYS[2], ARGV[4], '1')
+    return {count, 1}
+end
+return {count, 0}
+"""
+
+# The SHA only depends on the script bytes, so the script is not bound to a
+# client; the caller's client is passed on each call (EVALSHA, loaded on demand)
+_record_failed_attempt_script = AsyncScript(None, _RECORD_FAILED_ATTEMPT_LUA)
+
+
+async def record_failed_attempt_and_check_ban(
+    redis: Redis, ip: str, username: str
+) -> Tuple[int, bool]:
+    """
+    Record a failed login attempt and ban the IP once BAN_THRESHOLD is
+    reached (when ENABLE_IP_BANNING is on), atomically
+    Returns (failed attempt count, whether the IP was banned now)
+    """
+    now = int(datetime.utcnow().timestamp())
+    member = f"{username}:{now}:{uuid.uuid4().hex[:8]}"
+    threshold = settings.BAN_THRESHOLD if settings.ENABLE_IP_BANNING else 0
+    
+    count, banned = await _record_failed_attempt_script(
+        keys=[f"failed_attempts:{ip}", f"banned_ip:{ip}"],
+        args=[member, now, now - settings.BAN_DURATION, settings.BAN_DURATION, threshold],
+        client=redis,
+    )
+    if banned:
+        record_ip_ban(ip)
+    return count, bool(banned)
 
 
 async def get_failed_attempts(redis: Redis, ip: str) -> int:
@@ -90,19 +158,47 @@ async def get_failed_attempts(redis: Redis, ip: str) -> int:
     return count
 
 
-async def ban_ip(redis: Redis, ip: str, reason: str = "policy_violation"):
-    """Ban an IP address temporarily"""
+async def ban_ip(
+    redis: Redis,
+    ip: str,
+    reason: str = "policy_violation",
+    pipe: Optional[Pipeline] = None,
+):
+    """
+    Ban an IP address temporarily
+    With pipe, the command is only queued: the caller executes the pipeline
+    and then calls record_ip_ban, so nothing is cached or logged for a ban
+    that never reached Redis.
+    """
     key = f"banned_ip:{ip}"
+    if pipe is not None:
+        pipe.setex(key, settings.BAN_DURATION, "1")
+        return
     await redis.setex(key, settings.BAN_DURATION, "1")
+    record_ip_ban(ip, reason)
+
+
+def record_ip_ban(ip: str, reason: str = "policy_violation"):
+    """Cache, log and count an IP ban once it is stored in Redis"""
+    _cache_ban(ip)
     logger.warning("ip_banned", ip=ip, duration=settings.BAN_DURATION, reason=reason)
     observe_ip_ban(reason)
 
 
 async def is_ip_banned(redis: Redis, ip: str) -> bool:
     """Check if an IP is currently banned"""
+    expires = _ban_cache.get(ip)
+    if expires is not None:
+        if time.monotonic() < expires:
+            return True
+        del _ban_cache[ip]
+    
     key = f"banned_ip:{ip}"
     result = await redis.get(key)
-    return result is not None
+    if result is None:
+        return False
+    _cache_ban(ip)
+    return True
 
 
 async def clear_failed_attempts(redis: Redis, ip: str):
@@ -115,27 +211,26 @@ async def unban_ip(redis: Redis, ip: str):
     """Unban an IP address (for demo/testing purposes)"""
     ban_key = f"banned_ip:{ip}"
     attempts_key = f"failed_attempts:{ip}"
+    _ban_cache.pop(ip, None)
     await redis.delete(ban_key)
     await redis.delete(attempts_key)
     logger.info("ip_unbanned", ip=ip, reason="manual_unban")
 
 
-async def get_security_stats(redis: Redis) -> dict:
-    """Get overall security statistics"""
-    # Count banned IPs
-    banned_keys = await redis.keys("banned_ip:*")
+async def _summarize_security_stats(
+    redis: Redis, banned_keys: List[str], failed_keys: List[str]
+) -> dict:
+    """Build the overall statistics from the banned/failed key listings"""
     banned_count = len(banned_keys) if banned_keys else 0
-    
-    # Count IPs with failed attempts
-    failed_keys = await redis.keys("failed_attempts:*")
     failed_count = len(failed_keys) if failed_keys else 0
     
-    # Count total failed attempts
+    # Count total failed attempts (one ZCARD per key, one round-trip)
     total_failed = 0
     if failed_keys:
-        for key in failed_keys:
-            count = await redis.zcard(key)
-            total_failed += count
+        async with redis.pipeline(transaction=False) as pipe:
+            for key in failed_keys:
+                pipe.zcard(key)
+            total_failed = sum(await pipe.execute())
     
     return {
         "total_banned_ips": banned_count,
@@ -144,6 +239,37 @@ async def get_security_stats(redis: Redis) -> dict:
     }
 
 
+async def get_security_stats(redis: Redis) -> dict:
+    """Get overall security statistics"""
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.keys("banned_ip:*")
+        pipe.keys("failed_attempts:*")
+        banned_keys, failed_keys = await pipe.execute()
+    
+    return await _summarize_security_stats(redis, banned_keys, failed_keys)
+
+
+async def fetch_stats_bundle(redis: Redis, ip: str) -> Tuple[int, bool, dict]:
+    """
+    Get the failed attempt count and ban status of an IP together with the
+    overall security statistics, batching the reads into pipelines
+    Returns (failed_attempts, is_banned, overall_stats)
+    """
+    key = f"failed_attempts:{ip}"
+    cutoff = int(datetime.utcnow().timestamp()) - settings.BAN_DURATION
+    
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zremrangebyscore(key, 0, cutoff)
+        pipe.zcard(key)
+        pipe.get(f"banned_ip:{ip}")
+        pipe.keys("banned_ip:*")
+        pipe.keys("failed_attempts:*")
+        _, failed_attempts, banned, banned_keys, failed_keys = await pipe.execute()
+    
+    overall = await _summarize_security_stats(redis, banned_keys, failed_keys)
+    return failed_attempts, banned is not None, overall
+
+
 # ========== JWT Token Management ==========
 
 def create_access_token(username: str) -> tuple[str, datetime]:
@@ -168,18 +294,17 @@ async def generate_token_bundle(redis: Redis, username: str) -> TokenBundle:
     refresh_token = secrets.token_urlsafe(32)
     refresh_expires_at = datetime.utcnow() + timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
     
-    # Store refresh token in Redis
     key = f"refresh_token:{refresh_token}"
-    await redis.setex(
-        key,
-        settings.REFRESH_TOKEN_EXPIRE_MINUTES * 60,
-        username
-    )
-    
-    # Track user's refresh tokens
     user_tokens_key = f"user_tokens:{username}"
-    await redis.sadd(user_tokens_key, refresh_token)
-    await redis.expire(user_tokens_key, settings.REFRESH_TOKEN_EXPIRE_MINUTES * 60)
+    ttl = settings.REFRESH_TOKEN_EXPIRE_MINUTES * 60
+    
+    # Store refresh token in Redis and track it in the user's token set
+    # (one round-trip)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.setex(key, ttl, username)
+        pipe.sadd(user_tokens_key, refresh_token)
+        pipe.expire(user_tokens_key, ttl)
+        await pipe.execute()
     
     return TokenBundle(
         access_token=access_token,
@@ -302,10 +427,18 @@ async def increment_mfa_attempts(redis: Redis, challenge_id: str) -> int:
     return attempts
 
 
-async def delete_mfa_challenge(redis: Redis, challenge_id: str):
-    """Delete an MFA challenge"""
+async def delete_mfa_challenge(
+    redis: Redis, challenge_id: str, pipe: Optional[Pipeline] = None
+):
+    """
+    Delete an MFA challenge
+    With pipe, the command is only queued; the caller executes the pipeline.
+    """
     key = f"mfa_challenge:{challenge_id}"
-    await redis.delete(key)
+    if pipe is not None:
+        pipe.delete(key)
+    else:
+        await redis.delete(key)
 
 
 
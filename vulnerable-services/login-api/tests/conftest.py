@@ -9,6 +9,7 @@ from fastapi.testclient import TestClient
 from redis.asyncio import Redis
 
 from app.main import app
+from app.security import _ban_cache
 
 
 @pytest.fixture(scope="session")
@@ -29,15 +30,40 @@ def setup_test_env():
     yield
 
 
+class MockPipeline:
+    """Queues calls to the mock Redis methods and runs them on execute()."""
+
+    def __init__(self, redis):
+        self._redis = redis
+        self._calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self._calls.append(getattr(self._redis, name)(*args, **kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        calls, self._calls = self._calls, []
+        return [await call for call in calls]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._calls = []
+
+
 @pytest.fixture(scope="function")
 def client() -> TestClient:
     """Create a test client for the FastAPI app with mock Redis."""
-    from unittest.mock import AsyncMock
+    from unittest.mock import AsyncMock, MagicMock
     from app.main import limiter
     
-    # Clear rate limiter storage before each test
+    # Clear rate limiter storage and cached bans before each test
     if hasattr(limiter, '_storage'):
         limiter._storage.storage.clear()
+    _ban_cache.clear()
     
     # Create mock Redis for client tests (fresh for each test)
     mock_redis = AsyncMock()
@@ -82,6 +108,10 @@ def client() -> TestClient:
     mock_redis.srem = AsyncMock(return_value=1)
     mock_redis.smembers = AsyncMock(return_value=set())
     mock_redis.keys = AsyncMock(return_value=[])
+    mock_redis.evalsha = AsyncMock(return_value=[0, 0])  # [failed count, banned]
+    mock_redis.pipeline = MagicMock(
+        side_effect=lambda transaction=True: MockPipeline(mock_redis)
+    )
     
     app.state.redis = mock_redis
     
@@ -99,8 +129,9 @@ async def redis_client() -> AsyncGenerator[Redis, None]:
         decode_responses=True,
     )
     
-    # Clear test database before each test
+    # Clear test database (and the in-process ban cache) before each test
     await redis.flushdb()
+    _ban_cache.clear()
     
     yield redis
     
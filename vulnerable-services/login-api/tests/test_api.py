@@ -129,6 +129,36 @@ class TestMFAVerifyEndpoint:
                     status.HTTP_429_TOO_MANY_REQUESTS,  # Rate limiter may trigger
                 ]
 
+    def test_mfa_lockout_ban_recorded_only_after_pipeline_succeeds(
+        self, client, test_credentials, monkeypatch
+    ):
+        """A ban whose pipeline fails must not be cached or logged"""
+        from redis.exceptions import ConnectionError as RedisConnectionError
+        from app import security
+
+        login_response = client.post("/auth/login", json=test_credentials)
+        challenge_id = login_response.json()["challenge_id"]
+
+        redis = client.app.state.redis
+        redis.hincrby.return_value = 5  # next failure hits MFA_MAX_ATTEMPTS
+
+        async def failing_execute(self):
+            raise RedisConnectionError("connection lost")
+
+        pipeline = redis.pipeline(transaction=False)
+        monkeypatch.setattr(type(pipeline), "execute", failing_execute)
+        recorded = []
+        monkeypatch.setattr(security, "observe_ip_ban", recorded.append)
+
+        with pytest.raises(RedisConnectionError):
+            client.post(
+                "/auth/mfa/verify",
+                json={"challenge_id": challenge_id, "code": "000000"},
+            )
+
+        assert "testclient" not in security._ban_cache
+        assert recorded == []
+
 
 class TestTokenRefreshEndpoint:
     """Tests for /auth/token/refresh endpoint"""
@@ -12,6 +12,7 @@ from app.security import (
     generate_token_bundle,
     verify_refresh_token,
     record_failed_attempt,
+    record_failed_attempt_and_check_ban,
     get_failed_attempts,
     ban_ip,
     is_ip_banned,
@@ -150,6 +151,43 @@ class TestTokenBundle:
         assert username is None
 
 
+class TestBanCache:
+    """Tests for the in-process cache of confirmed bans"""
+
+    @pytest.fixture(autouse=True)
+    def small_cache(self, monkeypatch):
+        from app import security
+
+        now = [1000.0]
+        monkeypatch.setattr(security, "BAN_CACHE_SIZE", 3)
+        monkeypatch.setattr(security.time, "monotonic", lambda: now[0])
+        security._ban_cache.clear()
+        yield security, now
+        security._ban_cache.clear()
+
+    def test_full_cache_evicts_expired_entries_first(self, small_cache):
+        """Expired bans are dropped before any live one"""
+        security, now = small_cache
+        security._cache_ban("10.0.0.1")
+        security._cache_ban("10.0.0.2")
+        now[0] += security.BAN_CACHE_TTL
+        security._cache_ban("10.0.0.3")
+        security._cache_ban("10.0.0.4")
+
+        assert list(security._ban_cache) == ["10.0.0.3", "10.0.0.4"]
+
+    def test_full_cache_evicts_oldest_live_entry(self, small_cache):
+        """With nothing expired, only the oldest ban is dropped"""
+        security, now = small_cache
+        for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+            security._cache_ban(ip)
+            now[0] += 1
+        security._cache_ban("10.0.0.1")  # refreshed, now the newest
+        security._cache_ban("10.0.0.4")
+
+        assert list(security._ban_cache) == ["10.0.0.3", "10.0.0.1", "10.0.0.4"]
+
+
 @pytest.mark.asyncio
 class TestIPBanning:
     """Tests for IP banning functionality"""
@@ -209,6 +247,21 @@ class TestIPBanning:
         is_banned = await is_ip_banned(redis_client, ip)
         assert is_banned is True
 
+    async def test_record_failed_attempt_bans_at_threshold(self, redis_client, monkeypatch):
+        """Test that the ban is applied by the attempt that reaches the threshold"""
+        from app.config import settings
+        monkeypatch.setattr(settings, "BAN_THRESHOLD", 3)
+        ip = "192.168.1.100"
+        
+        for expected in (1, 2):
+            count, banned = await record_failed_attempt_and_check_ban(redis_client, ip, "admin")
+            assert (count, banned) == (expected, False)
+        assert await is_ip_banned(redis_client, ip) is False
+        
+        count, banned = await record_failed_attempt_and_check_ban(redis_client, ip, "admin")
+        assert (count, banned) == (3, True)
+        assert await is_ip_banned(redis_client, ip) is True
+
     async def test_ban_expiration(self, redis_client):
         """Test that IP ban has TTL set"""
         ip = "192.168.1.100"